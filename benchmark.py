@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from machine import Parser
+from processor import BODY, Processor
+from tables import VERSION, ParseTables
+
+# Benchmark of the YAPar pipeline on synthetic grammars. Every grammar is a
+# list of units, program: program unit | unit, where the units come from
+# one of the generators below, so inputs of any length are made of random
+# valid units:
+#   expression  a tower of size precedence levels over parenthesized atoms
+#   sequence    size statements, each a keyword and a long run of tokens
+#   left        a chain of size left-recursive nonterminals
+# Every stage is timed separately and the results are written as JSON.
+#
+# Usage: python benchmark.py [--kinds expression,left] [--sizes 10,50]
+#                            [--tokens 100000] [--repeat 3] [--output out.json]
+
+
+def expression_grammar(size):
+    rules = [('unit', ['e0 SEMI'])]
+    for level in range(size):
+        current = 'e' + str(level)
+        below = 'e' + str(level + 1)
+        rules.append((current, [current + ' OP' + str(level) + ' ' + below,
+                                below]))
+    rules.append(('e' + str(size), ['NUM', 'LPAREN e0 RPAREN']))
+    return rules
+
+
+def sequence_grammar(size):
+    statements = []
+    for number in range(size):
+        statements.append('KEY' + str(number) + ' ' +
+                          ' '.join('T' + str(position % 8)
+                                   for position in range(number + 1)) + ' SEMI')
+    return [('unit', statements)]
+
+
+def left_grammar(size):
+    rules = [('unit', ['l0 SEMI'])]
+    for level in range(size):
+        current = 'l' + str(level)
+        rules.append((current, [current + ' T' + str(level),
+                                'l' + str(level + 1)]))
+    rules.append(('l' + str(size), ['ATOM']))
+    return rules
+
+
+GRAMMARS = {
+    'expression': expression_grammar,
+    'sequence': sequence_grammar,
+    'left': left_grammar,
+}
+
+
+def grammar_source(rules):
+    terminals = sorted({symbol for header, bodies in rules for body in bodies
+                        for symbol in body.split() if not symbol.islower()})
+    lines = ['/* Synthetic grammar written by benchmark.py */',
+             '%token ' + ' '.join(terminals), '', '%%',
+             'program:', '    program unit', '    | unit', ';']
+    for header, bodies in rules:
+        lines.append(header + ':')
+        lines.append('    ' + '\n    | '.join(bodies))
+        lines.append(';')
+    return '\n'.join(lines) + '\n'
+
+
+# Random valid input of at least count tokens, made of sentences of unit.
+# Past depth every nonterminal takes the production with the shortest
+# derivation, so each sentence ends
+def token_stream(rules, count, depth, generator):
+    productions = {header: [body.split() for body in bodies]
+                   for header, bodies in rules}
+    height = {}
+    changed = True
+    while changed:
+        changed = False
+        for header, bodies in productions.items():
+            for body in bodies:
+                if any(symbol in productions and symbol not in height
+                       for symbol in body):
+                    continue
+                value = 1 + max((height[symbol] for symbol in body
+                                 if symbol in productions), default=0)
+                if value < height.get(header, value + 1):
+                    height[header] = value
+                    changed = True
+    shortest = {header: min(bodies, key=lambda body: max(
+        (height[symbol] for symbol in body if symbol in productions), default=0))
+        for header, bodies in productions.items()}
+    tokens = []
+    while len(tokens) < count:
+        pending = [('unit', 0)]
+        while pending:
+            symbol, level = pending.pop()
+            if symbol not in productions:
+                tokens.append(symbol)
+                continue
+            if level >= depth:
+                body = shortest[symbol]
+            else:
+                body = generator.choice(productions[symbol])
+            pending.extend((item, level + 1) for item in reversed(body))
+    return tokens
+
+
+def timed(function, *arguments):
+    start = time.perf_counter()
+    value = function(*arguments)
+    return value, time.perf_counter() - start
+
+
+# One build of filename through the Processor stages, returning the
+# processor and the seconds spent in each stage
+def build(filename):
+    processor = Processor(filename)
+    stages = {}
+    _, stages['detect_and_handle_errors'] = timed(
+        processor.detect_and_handle_errors)
+    processor.grammar, stages['build_and_transform_grammar'] = timed(
+        processor.build_and_transform_grammar)
+    _, stages['analyze'] = timed(processor.grammar.analyze)
+    processor.parser = Parser(processor.grammar)
+    processor.automata, stages['build_automata'] = timed(
+        lambda: processor.build_automata(processor.first_set()))
+    (processor.actionTable, processor.goToTable), stages['create_table'] = \
+        timed(processor.create_table)
+    return processor, stages
+
+
+def run(kind, size, tokenCount, repeat, depth, seed, directory):
+    rules = GRAMMARS[kind](size)
+    filename = os.path.join(directory, kind + str(size) + '.yalp')
+    with open(filename, 'w') as file:
+        file.write(grammar_source(rules))
+    best = None
+    for _ in range(repeat):
+        processor, stages = build(filename)
+        if best is None:
+            best = stages
+        else:
+            best = {stage: min(best[stage], seconds)
+                    for stage, seconds in stages.items()}
+    processor.tables = ParseTables(
+        processor.grammar.terminals + ['$'], list(processor.grammar.productions),
+        processor.parser.productions, processor.actionTable,
+        processor.goToTable, processor.grammar.follow)
+    # The body of a generated parser, run on the tables just built
+    namespace = {'__name__': 'benchmark_parser', 'sys': sys,
+                 'parseTables': processor.tables, 'scanTables': None}
+    exec(compile(BODY, filename, 'exec'), namespace)
+    tokens = token_stream(rules, tokenCount, depth, random.Random(seed))
+    seconds = None
+    for _ in range(repeat):
+        (accepted, errors), elapsed = timed(namespace['parse'], tokens)
+        if not accepted:
+            raise Exception('Generated input was rejected: ' + errors[0])
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return {
+        'grammar': kind,
+        'size': size,
+        'productions': len(processor.parser.productions),
+        'states': processor.stateCount,
+        'stages': best,
+        'parse': {'tokens': len(tokens), 'seconds': seconds,
+                  'tokensPerSecond': len(tokens) / seconds if seconds else None},
+    }
+
+
+def main():
+    arguments = argparse.ArgumentParser(
+        description='Time the YAPar pipeline on synthetic grammars')
+    arguments.add_argument('--kinds', default=','.join(GRAMMARS))
+    arguments.add_argument('--sizes', default='10,50,200')
+    arguments.add_argument('--tokens', type=int, default=100000)
+    arguments.add_argument('--repeat', type=int, default=3)
+    arguments.add_argument('--depth', type=int, default=12)
+    arguments.add_argument('--seed', type=int, default=0)
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in options.kinds.split(','):
+            if kind not in GRAMMARS:
+                raise Exception("Unknown grammar kind '" + kind + "'")
+            for size in options.sizes.split(','):
+                result = run(kind, int(size), options.tokens, options.repeat,
+                             options.depth, options.seed, directory)
+                print(f"{kind} {size}: {result['states']} states, " +
+                      ', '.join(f"{stage} {seconds:.4f}s" for stage,
+                                seconds in result['stages'].items()) +
+                      f", {result['parse']['tokensPerSecond']:.0f} tokens/s",
+                      file=sys.stderr)
+                results.append(result)
+    report = {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': vars(options),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# LALR class
+# LALR(1) lookaheads for the LR(0) automaton built by Processor.build_automata,
+# computed with the DeRemer-Pennello relations instead of the canonical LR(1)
+# collection. Sets of terminals are bitsets over terminal ids, and both
+# digraph passes are linear in the size of the relations:
+#   DR(p,A)      terminals shifted right after the transition p -A-> r
+#   reads        (p,A) reads (r,C) when r -C-> and C is nullable
+#   includes     (p,A) includes (p',B) when B -> b A g, g is nullable and
+#                p' -b-> p
+#   lookback     (q, A -> w) lookback (p,A) when p -w-> q
+#   Read   = digraph(reads, DR)
+#   Follow = digraph(includes, Read)
+#   LA(q, A -> w) = union of Follow(p,A) over lookback
+class LALR:
+    def __init__(this, parser, automaton):
+        this.parser = parser
+        this.nullable = parser.grammar.nullable
+        headers = parser.byHeader
+        goto = [dict() for _ in automaton.states]
+        for transition in automaton.transitions:
+            goto[transition.state.state][transition.symbol] = transition.next.state
+        this.goto = goto
+        this.terminals = ['$']
+        this.bits = {'$': 1}
+        transitions = []
+        index = {}
+        for state, row in enumerate(goto):
+            for symbol in row:
+                if symbol in headers:
+                    index[(state, symbol)] = len(transitions)
+                    transitions.append((state, symbol))
+                elif symbol not in this.bits:
+                    this.bits[symbol] = 1 << len(this.terminals)
+                    this.terminals.append(symbol)
+        this.transitions = transitions
+        direct = []
+        reads = []
+        start = parser.productions[0][1][0] if parser.productions else None
+        for state, symbol in transitions:
+            target = goto[state][symbol]
+            value = 0
+            edges = []
+            for following, next_state in goto[target].items():
+                if following in headers:
+                    if following in this.nullable:
+                        edges.append(index[(target, following)])
+                else:
+                    value |= this.bits[following]
+            if state == 0 and symbol == start:
+                value |= this.bits['$']
+            direct.append(value)
+            reads.append(edges)
+        includes = [[] for _ in transitions]
+        this.lookback = {}
+        for number, (state, header) in enumerate(transitions):
+            for production in headers[header]:
+                body = parser.productions[production][1]
+                current = state
+                path = []
+                for symbol in body:
+                    path.append(current)
+                    current = goto[current].get(symbol)
+                    if current is None:
+                        break
+                else:
+                    this.lookback.setdefault(
+                        (current, production), []).append(number)
+                    for position in range(len(body) - 1, -1, -1):
+                        symbol = body[position]
+                        if symbol in headers:
+                            includes[index[(path[position], symbol)]].append(
+                                number)
+                        if symbol not in this.nullable:
+                            break
+        read = this.digraph(reads, direct)
+        this.follow = this.digraph(includes, read)
+
+    # Tarjan-style traversal that unions F over every relation path and
+    # gives each strongly connected component a single shared value
+    def digraph(this, edges, initial):
+        count = len(edges)
+        values = list(initial)
+        depth = [0] * count
+        stack = []
+        for root in range(count):
+            if depth[root]:
+                continue
+            stack.append(root)
+            depth[root] = len(stack)
+            work = [(root, 0, len(stack))]
+            while work:
+                node, edge, pushed = work[-1]
+                if edge < len(edges[node]):
+                    work[-1] = (node, edge + 1, pushed)
+                    target = edges[node][edge]
+                    if depth[target] == 0:
+                        stack.append(target)
+                        depth[target] = len(stack)
+                        work.append((target, 0, len(stack)))
+                        continue
+                    depth[node] = min(depth[node], depth[target])
+                    values[node] |= values[target]
+                    continue
+                work.pop()
+                if depth[node] == pushed:
+                    while True:
+                        top = stack.pop()
+                        depth[top] = count + 1
+                        values[top] = values[node]
+                        if top == node:
+                            break
+                if work:
+                    parent = work[-1][0]
+                    depth[parent] = min(depth[parent], depth[node])
+                    values[parent] |= values[node]
+        return values
+
+    def decode(this, value):
+        result = set()
+        while value:
+            low = value & -value
+            result.add(this.terminals[low.bit_length() - 1])
+            value ^= low
+        return result
+
+    # Lookahead terminals of the completed item of production in state
+    def lookaheads(this, state, production):
+        value = 0
+        for number in this.lookback.get((state, production), ()):
+            value |= this.follow[number]
+        return this.decode(value)
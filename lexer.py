@@ -0,0 +1,486 @@
+import re
+import sys
+from machine import Automaton, Node
+
+ESCAPES = {'n': '\n', 't': '\t', 's': ' ', 'r': '\r'}
+OPERATORS = '()|*+?#'
+
+
+# YALex class
+# Reads a .yal specification: comments (* *), an optional { header },
+# 'let name = regexp' definitions and one 'rule name = regexp { action } | ...'
+# entry point. Every alternative of the rule becomes a token whose name is
+# the string its action returns or prints
+class YALex:
+    def __init__(this, filename):
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                text = file.read()
+        except FileNotFoundError:
+            raise Exception('File could not be opened')
+        this.filename = filename
+        this.definitions = {}
+        this.rules = []
+        this.header = None
+        this.trailer = None
+        text = this.strip_comments(text)
+        sections = re.split(r'(?m)^[ \t]*(?=let\s|rule\s)', text)
+        if sections[0].strip().startswith('{'):
+            this.header = sections[0].strip()[1:-1].strip()
+        for section in sections[1:]:
+            if section.startswith('let'):
+                match = re.match(r'let\s+(\w+)\s*=\s*(.*)', section, re.S)
+                if not match:
+                    raise Exception("Invalid 'let' definition: " +
+                                    section.strip())
+                this.definitions[match.group(1)] = this.parse_regex(
+                    match.group(2).strip())
+            else:
+                match = re.match(r'rule\s+\w+[^=]*=\s*(.*)', section, re.S)
+                if not match:
+                    raise Exception("Invalid 'rule' definition: " +
+                                    section.strip())
+                this.parse_rule(match.group(1))
+        if not this.rules:
+            raise Exception("Missing 'rule' entry point")
+
+    # Removes (* *) comments outside quotes
+    def strip_comments(this, text):
+        result = []
+        i = 0
+        quote = None
+        while i < len(text):
+            char = text[i]
+            if quote:
+                result.append(char)
+                if char == '\\' and i + 1 < len(text):
+                    result.append(text[i + 1])
+                    i += 1
+                elif char == quote:
+                    quote = None
+            elif text.startswith('(*', i):
+                end = text.find('*)', i + 2)
+                if end < 0:
+                    raise Exception("Invalid comment format")
+                i = end + 2
+                continue
+            else:
+                if char in '\'"':
+                    quote = char
+                result.append(char)
+            i += 1
+        return ''.join(result)
+
+    # Splits text at top-level separators, skipping quotes and brackets
+    def split_top(this, text):
+        parts = []
+        depth = 0
+        quote = None
+        start = 0
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if quote:
+                if char == '\\':
+                    i += 1
+                elif char == quote:
+                    quote = None
+            elif char in '\'"':
+                quote = char
+            elif char in '([{':
+                depth += 1
+            elif char in ')]}':
+                depth -= 1
+            elif char == '|' and depth == 0:
+                parts.append(text[start:i])
+                start = i + 1
+            i += 1
+        parts.append(text[start:])
+        return parts
+
+    def parse_rule(this, text):
+        for alternative in this.split_top(text):
+            alternative = alternative.strip()
+            if not alternative:
+                continue
+            blocks = this.split_actions(alternative)
+            regex = blocks[0].strip()
+            action = blocks[1] if len(blocks) > 1 else None
+            if len(blocks) > 2:
+                this.trailer = blocks[2]
+            name = this.action_name(action) if action is not None else regex
+            this.rules.append((name, this.parse_regex(regex)))
+
+    # Regexp followed by its { action } blocks
+    def split_actions(this, text):
+        blocks = []
+        depth = 0
+        quote = None
+        start = 0
+        for i, char in enumerate(text):
+            if quote:
+                if char == quote and text[i - 1] != '\\':
+                    quote = None
+            elif char in '\'"':
+                quote = char
+            elif char == '{':
+                if depth == 0:
+                    if not blocks:
+                        blocks.append(text[:i])
+                    start = i + 1
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    blocks.append(text[start:i].strip())
+        if not blocks:
+            blocks.append(text)
+        return blocks
+
+    def action_name(this, action):
+        match = (re.search(r'"([^"]*)"', action) or
+                 re.search(r'return\s+(\w+)', action) or
+                 re.search(r'"(\w+)', action))
+        return match.group(1) if match else action.strip()
+
+    # Regular expressions are parsed to tuples:
+    #   ('set', negated, chars)  one character, in chars unless negated
+    #   ('cat', a, b) ('or', a, b) ('star', a) ('plus', a) ('opt', a)
+    def parse_regex(this, text):
+        this.tokens = this.lex_regex(text)
+        this.index = 0
+        tree = this.parse_union()
+        if this.index != len(this.tokens):
+            raise Exception("Invalid regular expression: " + text)
+        return tree
+
+    def read_char(this, text, i):
+        if text[i] == '\\' and i + 1 < len(text):
+            return ESCAPES.get(text[i + 1], text[i + 1]), i + 2
+        return text[i], i + 1
+
+    def read_quoted(this, text, i):
+        quote = text[i]
+        chars = []
+        i += 1
+        while i < len(text) and text[i] != quote:
+            char, i = this.read_char(text, i)
+            chars.append(char)
+        if i >= len(text):
+            raise Exception("Unterminated literal in: " + text)
+        return chars, i + 1
+
+    def lex_regex(this, text):
+        tokens = []
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if char.isspace():
+                i += 1
+            elif char in '\'"':
+                chars, i = this.read_quoted(text, i)
+                tokens.append(('string', chars))
+            elif char == '[':
+                i = this.lex_set(text, i + 1, tokens)
+            elif char == '_':
+                tokens.append(('atom', ('set', True, frozenset())))
+                i += 1
+            elif char in OPERATORS:
+                tokens.append(('op', char))
+                i += 1
+            elif char.isalpha():
+                match = re.match(r'[^\W\d]\w*', text[i:])
+                word = match.group(0)
+                if word in this.definitions:
+                    tokens.append(('atom', this.definitions[word]))
+                else:
+                    tokens.append(('string', list(word)))
+                i += len(word)
+            else:
+                char, i = this.read_char(text, i)
+                tokens.append(('string', [char]))
+        return tokens
+
+    def lex_set(this, text, i, tokens):
+        negated = text.startswith('^', i)
+        if negated:
+            i += 1
+        chars = set()
+        while i < len(text) and text[i] != ']':
+            if text[i].isspace():
+                i += 1
+                continue
+            if text[i] in '\'"':
+                items, i = this.read_quoted(text, i)
+            else:
+                char, i = this.read_char(text, i)
+                items = [char]
+            rest = text[i:].lstrip()
+            if len(items) == 1 and rest.startswith('-') and rest[1:].lstrip()[:1] in '\'"':
+                i = text.index('-', i) + 1
+                while text[i].isspace():
+                    i += 1
+                last, i = this.read_quoted(text, i)
+                chars.update(chr(code) for code in range(
+                    ord(items[0]), ord(last[0]) + 1))
+            else:
+                chars.update(items)
+        if i >= len(text):
+            raise Exception("Unterminated character set in: " + text)
+        tokens.append(('atom', ('set', negated, frozenset(chars))))
+        return i + 1
+
+    def peek(this):
+        return this.tokens[this.index] if this.index < len(this.tokens) else None
+
+    def parse_union(this):
+        tree = this.parse_concat()
+        while this.peek() == ('op', '|'):
+            this.index += 1
+            tree = ('or', tree, this.parse_concat())
+        return tree
+
+    def parse_concat(this):
+        tree = None
+        while this.peek() is not None and this.peek() not in (('op', '|'), ('op', ')')):
+            factor = this.parse_postfix()
+            tree = factor if tree is None else ('cat', tree, factor)
+        if tree is None:
+            raise Exception("Empty regular expression")
+        return tree
+
+    def parse_postfix(this):
+        tree = this.parse_difference()
+        while this.peek() in (('op', '*'), ('op', '+'), ('op', '?')):
+            tree = ({'*': 'star', '+': 'plus', '?': 'opt'}
+                    [this.peek()[1]], tree)
+            this.index += 1
+        return tree
+
+    # r1 # r2 is the difference of two character sets
+    def parse_difference(this):
+        tree = this.parse_atom()
+        while this.peek() == ('op', '#'):
+            this.index += 1
+            other = this.parse_atom()
+            if tree[0] != 'set' or other[0] != 'set':
+                raise Exception("'#' is only defined between character sets")
+            tree = this.difference(tree, other)
+        return tree
+
+    def difference(this, left, right):
+        if not left[1] and not right[1]:
+            return ('set', False, left[2] - right[2])
+        if not left[1]:
+            return ('set', False, left[2] & right[2])
+        if not right[1]:
+            return ('set', True, left[2] | right[2])
+        return ('set', False, right[2] - left[2])
+
+    def parse_atom(this):
+        token = this.peek()
+        if token is None:
+            raise Exception("Unexpected end of regular expression")
+        this.index += 1
+        kind, value = token
+        if kind == 'op' and value == '(':
+            tree = this.parse_union()
+            if this.peek() != ('op', ')'):
+                raise Exception("Missing ')' in regular expression")
+            this.index += 1
+            return tree
+        if kind == 'op':
+            raise Exception("Unexpected '" + value + "' in regular expression")
+        if kind == 'string':
+            tree = None
+            for char in value:
+                leaf = ('set', False, frozenset(char))
+                tree = leaf if tree is None else ('cat', tree, leaf)
+            return tree
+        return value
+
+
+# DFA class
+# Built directly from the syntax tree with the followpos construction over
+# character classes, then handed to machine.Automaton, which merges classes
+# that still behave alike and minimizes the states
+class DFA:
+    def __init__(this, rules):
+        this.names = [name for name, tree in rules]
+        this.leaves = []
+        root = None
+        for number, (name, tree) in enumerate(rules):
+            branch = Node('.', None, this.build(tree), this.leaf(('end', number)))
+            root = branch if root is None else Node('|', None, root, branch)
+        this.compute(root)
+        # Characters contained in exactly the same leaf sets behave the same
+        # everywhere, so they share a column. Column 0 holds the characters
+        # no set names
+        signatures = {}
+        for leaf in this.leaves:
+            if leaf.symbol[0] == 'set':
+                for char in leaf.symbol[2]:
+                    signatures.setdefault(char, []).append(leaf.pos)
+        classes = {(): 0}
+        this.columns = {char: classes.setdefault(tuple(signature), len(classes))
+                        for char, signature in signatures.items()}
+        this.width = len(classes)
+        other = 0
+        contains = [set() for leaf in this.leaves]
+        for signature, column in classes.items():
+            for position in signature:
+                contains[position].add(column)
+        matches = []
+        for leaf in this.leaves:
+            if leaf.symbol[0] == 'end':
+                matches.append(())
+            elif leaf.symbol[1]:
+                matches.append(tuple(column for column in range(this.width)
+                                     if column not in contains[leaf.pos]))
+            else:
+                matches.append(tuple(contains[leaf.pos]))
+        start = frozenset(leaf.pos for leaf in root.firstpos)
+        states = [start]
+        index = {start: 0}
+        table = []
+        accept = []
+        for positions in states:
+            row = [-1] * this.width
+            targets = {}
+            accepted = -1
+            for position in sorted(positions):
+                leaf = this.leaves[position]
+                if leaf.symbol[0] == 'end':
+                    if accepted < 0:
+                        accepted = leaf.symbol[1]
+                    continue
+                for column in matches[position]:
+                    targets.setdefault(column, set()).update(leaf.followpos)
+            for column, target in targets.items():
+                target = frozenset(target)
+                if target not in index:
+                    index[target] = len(states)
+                    states.append(target)
+                row[column] = index[target]
+            table.extend(row)
+            accept.append(accepted)
+        this.automaton = Automaton(table, accept, this.width, this.columns,
+                                   other)
+        this.automaton.compress().minimize().compress()
+        this.stateCount = this.automaton.stateCount
+
+    def leaf(this, symbol):
+        node = Node(symbol, None, None, None)
+        node.pos = len(this.leaves)
+        this.leaves.append(node)
+        return node
+
+    def build(this, tree):
+        kind = tree[0]
+        if kind == 'set':
+            return this.leaf(tree)
+        if kind == 'cat':
+            return Node('.', None, this.build(tree[1]), this.build(tree[2]))
+        if kind == 'or':
+            return Node('|', None, this.build(tree[1]), this.build(tree[2]))
+        if kind == 'star':
+            return Node('*', None, this.build(tree[1]), None)
+        if kind == 'plus':
+            return Node('.', None, this.build(tree[1]),
+                        Node('*', None, this.build(tree[1]), None))
+        return Node('|', None, this.build(tree[1]), Node('ε', None, None, None))
+
+    # nullable, firstpos, lastpos and followpos, in post-order
+    def compute(this, root):
+        order = []
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            for child in (node.prev, node.next):
+                if child is not None:
+                    child.parent = node
+                    pending.append(child)
+        for node in reversed(order):
+            node.followpos = set()
+            left, right = node.prev, node.next
+            if node.pos is not None:
+                node.nullable = False
+                node.firstpos = node.lastpos = {node}
+            elif node.symbol == 'ε':
+                node.nullable = True
+                node.firstpos = node.lastpos = set()
+            elif node.symbol == '|':
+                node.nullable = left.nullable or right.nullable
+                node.firstpos = left.firstpos | right.firstpos
+                node.lastpos = left.lastpos | right.lastpos
+            elif node.symbol == '.':
+                node.nullable = left.nullable and right.nullable
+                node.firstpos = left.firstpos | right.firstpos if left.nullable else left.firstpos
+                node.lastpos = left.lastpos | right.lastpos if right.nullable else right.lastpos
+                for leaf in left.lastpos:
+                    leaf.followpos.update(item.pos for item in right.firstpos)
+            else:
+                node.nullable = True
+                node.firstpos = left.firstpos
+                node.lastpos = left.lastpos
+                for leaf in left.lastpos:
+                    leaf.followpos.update(item.pos for item in left.firstpos)
+
+
+# Lexer class
+# Scans text in one pass with longest-match semantics, earlier rules win
+# ties. Tokens named in ignore (the IGNORE list of the .yalp) are dropped
+class Lexer:
+    def __init__(this, filename, ignore=()):
+        this.spec = YALex(filename)
+        this.dfa = DFA(this.spec.rules)
+        this.ignore = set(ignore)
+
+    # Yields (name, lexeme, offset) for every token that is not ignored
+    def scan(this, text):
+        automaton = this.dfa.automaton
+        table = automaton.table
+        accept = automaton.accept
+        width = automaton.width
+        latin = automaton.latin
+        classOf = automaton.classOf
+        names = this.dfa.names
+        ignore = this.ignore
+        position = 0
+        length = len(text)
+        while position < length:
+            state = 0
+            last = -1
+            end = position
+            cursor = position
+            while cursor < length:
+                code = ord(text[cursor])
+                column = latin[code] if code < 256 else classOf(text[cursor])
+                state = table[state * width + column]
+                if state < 0:
+                    break
+                cursor += 1
+                if accept[state] >= 0:
+                    last = accept[state]
+                    end = cursor
+            if last < 0:
+                raise Exception("Lexical error at offset {}: unexpected {!r}".format(
+                    position, text[position]))
+            if names[last] not in ignore:
+                yield names[last], text[position:end], position
+            position = end
+
+    def tokens(this, text):
+        for name, lexeme, position in this.scan(text):
+            yield name
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python lexer.py spec.yal input.txt [IGNORED ...]")
+        sys.exit(1)
+    lexer = Lexer(sys.argv[1], sys.argv[3:])
+    with open(sys.argv[2], 'r', encoding='utf-8') as file:
+        for name, lexeme, position in lexer.scan(file.read()):
+            print(f"{position:<6} {name:<12} {lexeme!r}")
@@ -1,4 +1,6 @@
 import copy
+from array import array
+from bisect import bisect_right
 from queue import LifoQueue  # For stack operations
 import re
 import graphviz as gv
@@ -11,6 +13,8 @@ class Machine:
         this.startingState = startingState
         this.finalState = finalState
         this.states = []
+        this.adjacency = None
+        this.adjacencySize = 0
 
     def getFinalMachineState(this):
         return this.finalState
@@ -19,30 +23,166 @@ class Machine:
         return this.startingState
 
     def getStates(this):
-        states = []
+        states = {}
         for transition in this.transitions:
-            if transition.state not in states:
-                states.append(transition.state)
-            if transition.next not in states:
-                states.append(transition.next)
+            states[transition.state] = None
+            states[transition.next] = None
         this.states = sorted(states)
 
     def getTransitionStates(this):
-        states = []
+        states = {}
         for transition in this.transitions:
-            if transition.state.state not in states:
-                states.append(transition.state)
-            if transition.next.state not in states:
-                states.append(transition.next)
-        this.states = states
+            states.setdefault(transition.state.state, transition.state)
+            states.setdefault(transition.next.state, transition.next)
+        this.states = list(states.values())
+
+    # Outgoing transitions as adjacency lists indexed by source state id
+    def getAdjacency(this):
+        if this.adjacency is None or this.adjacencySize != len(this.transitions):
+            adjacency = {}
+            for transition in this.transitions:
+                adjacency.setdefault(transition.state.state, []).append(transition)
+            size = max(max(adjacency, default=-1) + 1, len(this.states))
+            this.adjacency = [adjacency.get(state, []) for state in range(size)]
+            this.adjacencySize = len(this.transitions)
+        return this.adjacency
 
     def display(this):
-        states = []
-        for transition in this.transitions:
-            if transition.state not in states:
-                states.append(transition.state)
-            if transition.next not in states:
-                states.append(transition.next)
+        this.getTransitionStates()
+
+
+# Automaton class
+# Deterministic automaton kept as adjacency arrays indexed by state id: a
+# row-major array of states x character classes (-1 is the dead state) and
+# the accepting tag of every state (-1 when not accepting). State 0 is the
+# start. columns maps each character named by the automaton to its class
+# and every other character falls in class other
+class Automaton:
+    def __init__(this, table, accept, width, columns, other):
+        this.table = array('i', table)
+        this.accept = array('i', accept)
+        this.width = width
+        this.columns = dict(columns)
+        this.other = other
+        this.stateCount = len(this.accept)
+        this.index()
+
+    # Merges columns that are identical in every state into one class
+    def compress(this):
+        classes = {}
+        classOf = []
+        for column in range(this.width):
+            vector = tuple(this.table[column::this.width])
+            classOf.append(classes.setdefault(vector, len(classes)))
+        if len(classes) == this.width:
+            return this
+        table = array('i', [0]) * (this.stateCount * len(classes))
+        for vector, number in classes.items():
+            table[number::len(classes)] = array('i', vector)
+        this.table = table
+        this.width = len(classes)
+        this.columns = {char: classOf[column]
+                        for char, column in this.columns.items()}
+        this.other = classOf[this.other]
+        this.index()
+        return this
+
+    # Hopcroft partition refinement. A sink stands in for the dead state,
+    # states that cannot reach an accepting state end up merged with it and
+    # are dropped again
+    def minimize(this):
+        width = this.width
+        sink = this.stateCount
+        count = sink + 1
+
+        def target(state, column):
+            if state == sink:
+                return sink
+            following = this.table[state * width + column]
+            return sink if following < 0 else following
+        inverse = [[[] for _ in range(count)] for _ in range(width)]
+        for state in range(count):
+            for column in range(width):
+                inverse[column][target(state, column)].append(state)
+        groups = {}
+        for state in range(count):
+            tag = this.accept[state] if state < sink else -1
+            groups.setdefault(tag, []).append(state)
+        blocks = [set(group) for group in groups.values()]
+        blockOf = [0] * count
+        for number, block in enumerate(blocks):
+            for state in block:
+                blockOf[state] = number
+        pending = set(range(len(blocks)))
+        while pending:
+            splitter = set(blocks[pending.pop()])
+            for column in range(width):
+                touched = {}
+                for state in splitter:
+                    for source in inverse[column][state]:
+                        touched.setdefault(blockOf[source], set()).add(source)
+                for number, inside in touched.items():
+                    block = blocks[number]
+                    if len(inside) == len(block):
+                        continue
+                    block -= inside
+                    blocks.append(inside)
+                    created = len(blocks) - 1
+                    for state in inside:
+                        blockOf[state] = created
+                    if number in pending or len(inside) <= len(block):
+                        pending.add(created)
+                    else:
+                        pending.add(number)
+        dead = blockOf[sink]
+        order = {}
+        pending = [blockOf[0]]
+        while pending:
+            block = pending.pop()
+            if block in order or block == dead:
+                continue
+            order[block] = len(order)
+            state = next(iter(blocks[block]))
+            for column in range(width - 1, -1, -1):
+                pending.append(blockOf[target(state, column)])
+        table = array('i', [-1]) * (len(order) * width)
+        accept = array('i', [-1]) * len(order)
+        for block, number in order.items():
+            state = next(iter(blocks[block]))
+            accept[number] = this.accept[state]
+            for column in range(width):
+                following = blockOf[target(state, column)]
+                if following != dead:
+                    table[number * width + column] = order[following]
+        this.table = table
+        this.accept = accept
+        this.stateCount = len(order)
+        return this
+
+    # Class lookup: a 256-entry array for Latin-1 and sorted runs of equal
+    # class for the characters above it
+    def index(this):
+        this.latin = array('i', [this.other]) * 256
+        runs = []
+        for char, column in sorted(this.columns.items()):
+            code = ord(char)
+            if code < 256:
+                this.latin[code] = column
+            elif runs and runs[-1][1] == code - 1 and runs[-1][2] == column:
+                runs[-1][1] = code
+            elif column != this.other:
+                runs.append([code, code, column])
+        this.runStarts = [run[0] for run in runs]
+        this.runs = runs
+
+    def classOf(this, char):
+        code = ord(char)
+        if code < 256:
+            return this.latin[code]
+        position = bisect_right(this.runStarts, code) - 1
+        if position >= 0 and code <= this.runs[position][1]:
+            return this.runs[position][2]
+        return this.other
 
 
 # State class
@@ -126,11 +266,13 @@ class Stack:
 
 
 # Set class
+# heart holds the kernel items and productions the full closure, both as
+# frozensets of (production id, dot position) pairs
 class Set:
-    def __init__(this):
-        this.heart = {}
-        this.productions = {}
-        this.rest = {}
+    def __init__(this, heart=frozenset(), productions=frozenset()):
+        this.heart = heart
+        this.productions = productions
+        this.rest = productions - heart
         this.state = 0
 
     def getHeart(this):
@@ -185,14 +327,32 @@ closure = parser.closure(items)
 
 
 # Grammar class
+# Markers that stand for an empty production body
+EPSILON = ('EPSILON', 'ε')
+# Terminal of error productions, shifted by the parser while it recovers
+ERROR_TOKEN = 'error'
+# Marker that gives a production the precedence of the token after it
+PREC = '%prec'
+
+
 class Grammar:
     def __init__(this):
         this.initialState = None
         this.terminals = []
         this.nonTerminals = []
+        this.nullable = set()
         this.first = {}
         this.follow = {}
+        this.changedFollow = set()
         this.productions = {}
+        this.symbols = []
+        this.symbolId = {}
+        this.terminalCount = 0
+        this.rules = None
+        this.byHeader = []
+        this.uses = []
+        this.precedence = {}
+        this.rulePrecedence = []
 
     def getTerminals(this):
         return this.terminals
@@ -206,69 +366,308 @@ class Grammar:
     def getProductions(this):
         return this.productions
 
+    # Body symbols of a production, without the markers of an empty body or
+    # a trailing '%prec TOKEN'
+    def split(this, production):
+        symbols = production.split()
+        if PREC in symbols:
+            del symbols[symbols.index(PREC):]
+        return tuple(symbol for symbol in symbols if symbol not in EPSILON)
+
+    # Token whose precedence a production takes: the one named by %prec or
+    # else the last terminal of its body
+    def precedence_of(this, production):
+        symbols = production.split()
+        if PREC in symbols:
+            position = symbols.index(PREC)
+            return symbols[position + 1] if position + 1 < len(symbols) else None
+        for symbol in reversed(this.split(production)):
+            if symbol not in this.productions:
+                return symbol
+        return None
+
+    # Integer-coded copy of the productions. Every symbol gets an id, the
+    # terminals first ('$' is 0) and the nonterminals after them in header
+    # order. rules holds (header id, body ids) for every production in
+    # grammar order, so a production's id is its index and the tables number
+    # it id + 1. terminals and nonTerminals are rebuilt from the same split,
+    # a symbol being a nonterminal when it has a rule. byHeader lists the
+    # productions of each symbol, uses the productions whose body mentions
+    # it and rulePrecedence the token that gives each production its
+    # precedence
+    def encode(this):
+        bodies = [(header, this.split(production))
+                  for header, values in this.productions.items()
+                  for production in values]
+        symbols = ['$']
+        seen = {'$'}
+        for header, body in bodies:
+            for symbol in body:
+                if symbol not in seen and symbol not in this.productions:
+                    seen.add(symbol)
+                    symbols.append(symbol)
+        this.terminalCount = len(symbols)
+        symbols.extend(this.productions)
+        # The first header is the augmented start symbol
+        this.terminals = sorted(symbols[1:this.terminalCount])
+        this.nonTerminals = sorted(symbols[this.terminalCount + 1:])
+        this.symbols = symbols
+        this.symbolId = {symbol: number for number, symbol in enumerate(symbols)}
+        symbolId = this.symbolId
+        this.rules = [(symbolId[header], tuple(symbolId[symbol] for symbol in body))
+                      for header, body in bodies]
+        this.rulePrecedence = [this.precedence_of(production)
+                               for values in this.productions.values()
+                               for production in values]
+        this.byHeader = [[] for _ in symbols]
+        this.uses = [[] for _ in symbols]
+        for number, (header, body) in enumerate(this.rules):
+            this.byHeader[header].append(number)
+            for symbol in set(body):
+                this.uses[symbol].append(number)
+        return this.rules
+
+    # Nullable, FIRST and FOLLOW for the whole grammar, iterated to a fixed
+    # point over the integer-coded rules with terminal bitsets (bit i is the
+    # terminal with id i) and cached on the grammar. The first header is
+    # taken as the (augmented) start symbol and is followed by '$'.
+    # previous is the analysis of an earlier build, as saved by Processor,
+    # and changed the headers whose productions differ from it: only the
+    # entries those headers can reach are recomputed, the rest are reused.
+    # changedFollow is left with the headers whose FOLLOW set is not the
+    # one of the earlier build
+    def analyze(this, previous=None, changed=None):
+        rules = this.encode()
+        symbols = this.symbols
+        symbolId = this.symbolId
+        count = this.terminalCount
+        headers = range(count, len(symbols))
+        bits = [1 << symbol if symbol < count else 0
+                for symbol in range(len(symbols))]
+
+        def encode(values):
+            value = 0
+            for terminal in values:
+                symbol = symbolId.get(terminal)
+                if symbol is not None and symbol < count:
+                    value |= 1 << symbol
+            return value
+
+        def decode(value):
+            result = []
+            while value:
+                low = value & -value
+                result.append(symbols[low.bit_length() - 1])
+                value ^= low
+            return frozenset(result)
+        nullable = [False] * len(symbols)
+        stale = set(headers)
+        if previous is not None:
+            names = changed
+            changed = {symbolId[header] for header in names
+                       if header in symbolId}
+            stale = this.reaching(changed)
+            for header in headers:
+                if header not in stale:
+                    nullable[header] = symbols[header] in previous['nullable']
+                    bits[header] = encode(previous['first'][symbols[header]])
+        this.first_sets([rule for rule in rules if rule[0] in stale],
+                        nullable, bits)
+        follow = [0] * len(symbols)
+        targets = set(headers)
+        if previous is not None:
+            targets = this.following(nullable, stale, changed, names,
+                                     previous['productions'])
+            for header in headers:
+                if header not in targets:
+                    follow[header] = encode(previous['follow'][symbols[header]])
+        if count < len(symbols):
+            follow[count] |= 1
+        this.follow_sets(rules, nullable, bits, follow, targets)
+        this.nullable = {symbols[header] for header in headers
+                         if nullable[header]}
+        this.first = {symbols[symbol]: decode(bits[symbol])
+                      for symbol in range(1, len(symbols))}
+        this.follow = {symbols[header]: decode(follow[header])
+                       for header in headers}
+        this.changedFollow = set(this.productions)
+        if previous is not None:
+            this.changedFollow = {symbols[header] for header in targets
+                                  if this.follow[symbols[header]] !=
+                                  previous['follow'].get(symbols[header])}
+        return this.first, this.follow
+
+    # Nullable flags and FIRST bitsets of the headers of rules, grown in
+    # place to a fixed point
+    def first_sets(this, rules, nullable, bits):
+        growing = True
+        while growing:
+            growing = False
+            for header, body in rules:
+                first = bits[header]
+                for symbol in body:
+                    first |= bits[symbol]
+                    if not nullable[symbol]:
+                        break
+                else:
+                    if not nullable[header]:
+                        nullable[header] = True
+                        growing = True
+                if first != bits[header]:
+                    bits[header] = first
+                    growing = True
+
+    # FOLLOW bitsets of the headers in targets, grown in place to a fixed
+    # point over every rule
+    def follow_sets(this, rules, nullable, bits, follow, targets):
+        count = this.terminalCount
+        growing = True
+        while growing:
+            growing = False
+            for header, body in rules:
+                trailer = follow[header]
+                for symbol in reversed(body):
+                    if symbol >= count:
+                        if symbol in targets and \
+                                follow[symbol] | trailer != follow[symbol]:
+                            follow[symbol] |= trailer
+                            growing = True
+                        if nullable[symbol]:
+                            trailer |= bits[symbol]
+                        else:
+                            trailer = bits[symbol]
+                    else:
+                        trailer = bits[symbol]
+
+    # Headers whose FIRST or nullability may differ after the productions of
+    # the changed symbols were edited: the changed headers and every header
+    # with a production that mentions one of them, transitively
+    def reaching(this, changed):
+        rules = this.rules
+        stale = {symbol for symbol in changed if symbol >= this.terminalCount}
+        pending = list(changed)
+        while pending:
+            for number in this.uses[pending.pop()]:
+                header = rules[number][0]
+                if header not in stale:
+                    stale.add(header)
+                    pending.append(header)
+        return stale
+
+    # Headers whose FOLLOW may differ: those mentioned by the old or new
+    # productions of the changed headers (names holds them all, removed ones
+    # included), those followed by a symbol whose FIRST is stale, and the
+    # headers their FOLLOW flows into through nullable tails
+    def following(this, nullable, stale, changed, names, productions):
+        count = this.terminalCount
+        symbolId = this.symbolId
+        targets = {symbol for symbol in changed if symbol >= count}
+        for header in names:
+            for production in productions.get(header, []):
+                targets.update(symbolId[name] for name in this.split(production)
+                               if symbolId.get(name, 0) >= count)
+        for symbol in changed:
+            for number in this.byHeader[symbol]:
+                targets.update(item for item in this.rules[number][1]
+                               if item >= count)
+        flows = {}
+        for header, body in this.rules:
+            after = False
+            for symbol in reversed(body):
+                if symbol >= count and after:
+                    targets.add(symbol)
+                after = after or symbol in stale
+            for symbol in reversed(body):
+                if symbol >= count:
+                    flows.setdefault(header, set()).add(symbol)
+                if not nullable[symbol]:
+                    break
+        pending = list(targets)
+        while pending:
+            for symbol in flows.get(pending.pop(), ()):
+                if symbol not in targets:
+                    targets.add(symbol)
+                    pending.append(symbol)
+        return targets
+
 
 # Parser class
+# Items are (production id, dot position) pairs over the integer-coded rules
+# of the grammar. productions and byHeader give the same productions by
+# symbol name for the table builder and the reports
 class Parser:
-    def __init__(this, cannonGrammar):
-        this.cannonGrammar = cannonGrammar
-
+    def __init__(this, grammar):
+        if grammar.rules is None:
+            grammar.encode()
+        this.grammar = grammar
+        this.cannonGrammar = grammar.productions
+        this.rules = grammar.rules
+        this.terminalCount = grammar.terminalCount
+        symbols = grammar.symbols
+        this.productions = [(symbols[header], tuple(symbols[symbol]
+                                                    for symbol in body))
+                            for header, body in grammar.rules]
+        this.byHeader = {symbols[header]: grammar.byHeader[header]
+                         for header in range(grammar.terminalCount,
+                                             len(symbols))}
+        this.closures = {}
+
+    # FIRST of a symbol, read from the sets cached by Grammar.analyze
     def first(this, simbolo):
-        if simbolo in this.cannonGrammar:
-            productions = this.cannonGrammar[simbolo]
-            result = set()
-            for production in productions:
-                first = this.first(production[0])
-                result = result.union(first)
-            return result
-        else:
-            return {simbolo}
+        return this.grammar.first.get(simbolo, frozenset([simbolo]))
 
+    # FOLLOW of a nonterminal, read from the sets cached by Grammar.analyze
     def goto(this, no_terminal):
-        result = set()
-        if no_terminal == 'S':
-            result.add('$')
-        for simbolo in this.cannonGrammar:
-            productions = this.cannonGrammar[simbolo]
-            for production in productions:
-                symbols = production.split()
-                if no_terminal in symbols:
-                    idx = symbols.index(no_terminal)
-                    if idx < len(symbols)-1:
-                        first = this.first(symbols[idx+1])
-                        result = result.union(first)
-                    else:
-                        if simbolo != no_terminal:
-                            result = result.union(this.goto(simbolo))
-        return result
+        return this.grammar.follow[no_terminal]
 
+    # Closure over (production id, dot position) items using a worklist,
+    # each nonterminal is expanded at most once per closure. Closures are
+    # memoized by kernel in closures, which Processor seeds with the ones an
+    # incremental rebuild can keep
     def closure(this, items):
-        closure = items
-        new_items = True
-        while new_items:
-            new_items = False
-            for item in closure.copy():
-                parts = item.split(' -> ')
-                if parts[1] != '':
-                    symbols = parts[1].split()
-                    if symbols[0] in this.cannonGrammar:
-                        firsts = this.first(symbols[1])
-                        for production in this.cannonGrammar[symbols[0]]:
-                            new_item = symbols[0] + ' -> . ' + production
-                            if new_item not in closure:
-                                new_items = True
-                                closure.add(new_item)
-                                closure = closure.union(
-                                    this.closure({new_item}))
-                        if 'ε' in firsts:
-                            new_item = parts[0] + \
-                                ' -> ' + ' '.join(symbols[1:])
-                            if new_item not in closure:
-                                new_items = True
-                                closure.add(new_item)
-                                closure = closure.union(
-                                    this.closure({new_item}))
+        cached = this.closures.get(items)
+        if cached is not None:
+            return cached
+        rules = this.rules
+        byHeader = this.grammar.byHeader
+        count = this.terminalCount
+        closure = set(items)
+        pending = list(items)
+        expanded = set()
+        while pending:
+            production, dot = pending.pop()
+            body = rules[production][1]
+            if dot < len(body):
+                symbol = body[dot]
+                if symbol >= count and symbol not in expanded:
+                    expanded.add(symbol)
+                    for number in byHeader[symbol]:
+                        item = (number, 0)
+                        if item not in closure:
+                            closure.add(item)
+                            pending.append(item)
+        closure = frozenset(closure)
+        this.closures[items] = closure
         return closure
 
+    # Kernels reached from items for every symbol after a dot, in one pass
+    def transitions(this, items):
+        rules = this.rules
+        hearts = {}
+        for production, dot in sorted(items):
+            body = rules[production][1]
+            if dot < len(body):
+                hearts.setdefault(body[dot], set()).add(
+                    (production, dot + 1))
+        symbols = this.grammar.symbols
+        return {symbols[symbol]: frozenset(heart)
+                for symbol, heart in hearts.items()}
+
+    def format_item(this, item):
+        production, dot = item
+        header, body = this.productions[production]
+        return header + ' -> ' + ' '.join(body[:dot] + ('.',) + body[dot:])
+
 
 # Parser class
 class LR0Automaton:
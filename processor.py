@@ -1,166 +1,771 @@
-import copy
-import pydot
+import os
 from machine import *
-from collections import OrderedDict
-import prettytable as pt
-from fpdf import FPDF
+from tables import ParseTables, ScanTables, save_tables, load_tables, \
+    save_build, load_build
+from lexer import Lexer
+from yalp import YALP
+from lalr import LALR
+from contextlib import nullcontext
 
 HEADER = """
-from processor import *
-from fpdf import FPDF
+import sys
+from tables import load_tables, share_tables, attach_tables
 
-processor = Processor('YAPar/' + 'yap1' + '.yalp')
-processor.compiler()
+cached = load_tables({filename!r}, {lexer!r}, {mode!r})
+if cached is None:
+    from processor import Processor
+    processor = Processor({filename!r}, lexer={lexer!r}, mode={mode!r})
+    processor.compiler()
+    parseTables = processor.tables
+    scanTables = processor.scanner
+else:
+    parseTables = cached['tables']
+    scanTables = cached['scanner']
+del cached
 """
-PDFCLASS = """
-class PDF(FPDF):
-    def header(this):
-        this.set_font("Arial", "B", 12)
-        this.cell(0, 10, "SLR Parser Report", ln=True)
-
-    def footer(this):
-        this.set_y(-15)
-        this.set_font("Arial", "I", 8)
-        this.cell(0, 10, f"Page {this.page_no()}", 0, 0, "C")
-
-    def chapter_title(this, title):
-        this.set_font("Arial", "B", 12)
-        this.ln(10)
-        this.cell(0, 10, title, ln=True)
-
-    def chapter_body(this, counter, stack, symbols, dataCopy, actionList, errorList):
-        this.set_font("Arial", "", 12)
-        this.cell(0, 10, f"Iteration {counter}:", ln=True)
-        this.cell(0, 10, f"Stack: {str(stack)}", ln=True)
-        this.cell(0, 10, f"Symbols: {str(symbols)}", ln=True)
-        this.cell(0, 10, f"Input: {str(dataCopy)}", ln=True)
-        this.ln(10)
-        this.cell(0, 10, "Actions:", ln=True)
-        for action in actionList:
-            this.cell(0, 10, action, ln=True)
-        this.ln(10)
-        if errorList:
-            this.cell(0, 10, "Errors:", ln=True)
-            for error in errorList:
-                this.cell(0, 10, error, ln=True)
-        this.ln(10)
+
+# Header of standalone parsers: the tables are embedded as literals and the
+# module only needs the standard library. Their workers keep the tables the
+# module was loaded with instead of sharing them
+STANDALONE_HEADER = """
+import sys
+from types import SimpleNamespace
+
+share_tables = attach_tables = None
+
+# Tables generated from {filename}
+{tables}
+parseTables = SimpleNamespace(
+    ACCEPT=-1, terminals=TERMINALS, nonTerminals=NONTERMINALS,
+    terminalIndex={{terminal: column for column,
+                   terminal in enumerate(TERMINALS)}},
+    productions=PRODUCTIONS, lhs=LHS, length=LENGTH, action=ACTION, goto=GOTO,
+    follow=tuple(frozenset(row) for row in FOLLOW))
+{scanner}"""
+
+STANDALONE_SCANNER = """
+# Scanner generated from {lexer}
+{tables}
+scanTables = SimpleNamespace(
+    table=SCAN_TABLE, accept=SCAN_ACCEPT, width={width}, other={other},
+    latin=SCAN_LATIN, runStarts=tuple(run[0] for run in SCAN_RUNS),
+    runs=SCAN_RUNS, names=SCAN_NAMES, ignored=SCAN_IGNORED)
 """
 
 BODY = r"""
+import json
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+
 def main():
+    arguments = sys.argv[1:]
+    recover = '--recover' in arguments
+    if recover:
+        arguments.remove('--recover')
+    if arguments and arguments[0] == '--serve':
+        import asyncio
+        try:
+            asyncio.run(serve(arguments[1] if len(arguments) > 1 else None,
+                              recover))
+        except KeyboardInterrupt:
+            pass
+        return
+    if arguments and arguments[0] == '--batch':
+        for filename, accepted, errorList in parse_files(arguments[1:],
+                                                         recover=recover):
+            print(f"{filename}: " + ("accepted" if accepted else
+                                     "\n    ".join(errorList)))
+        return
     filename = 'YAParFiles/' + 'input1' + '.txt'
+    trace = None
+    if len(arguments) > 0:
+        filename = arguments[0]
+    if len(arguments) > 1:
+        trace = arguments[1]
+    accepted, errorList = parse_source(filename, trace, recover)
+    if accepted:
+        print(f"\nTokens processed")
+    else:
+        print(f"\nError processing tokens")
+        for error in errorList:
+            print(error)
+
+
+# Whitespace-separated tokens of a file, read lazily in fixed-size chunks
+# so memory does not grow with the input
+def read_tokens(filename, chunkSize=1 << 16):
     with open(filename, 'r') as file:
-        data = file.read().split()
-    data.append('$')
-    parse(data)
+        rest = ''
+        while True:
+            chunk = file.read(chunkSize)
+            if not chunk:
+                break
+            words = (rest + chunk).split()
+            rest = ''
+            if words and not chunk[-1].isspace():
+                rest = words.pop()
+            yield from words
+        if rest:
+            yield rest
+
+
+# Raw text of a file in fixed-size chunks
+def read_chunks(filename, chunkSize=1 << 16):
+    with open(filename, 'r') as file:
+        while True:
+            chunk = file.read(chunkSize)
+            if not chunk:
+                break
+            yield chunk
+
+
+# With a generated scanner the input is raw text scanned on demand,
+# otherwise it is a file of whitespace-separated token names
+def tokens_of(filename, errors=None, recover=False):
+    if scanTables is not None:
+        return scan(read_chunks(filename), errors, recover)
+    return read_tokens(filename)
+
+
+# Longest-match scanner over a string or an iterable of text chunks. A match
+# that reaches the end of a chunk waits for the next one, so tokens may span
+# chunk boundaries. Yields token names, dropping the IGNOREd ones. A
+# character no token starts with raises, unless an errors list is given:
+# the error is appended to it and the scan stops there, or with recover
+# the character is skipped
+def scan(source, errors=None, recover=False):
+    if isinstance(source, str):
+        source = (source,)
+    tables = scanTables
+    table = tables.table
+    accept = tables.accept
+    width = tables.width
+    latin = tables.latin
+    runStarts = tables.runStarts
+    runs = tables.runs
+    other = tables.other
+    names = tables.names
+    ignored = tables.ignored
+    chunks = iter(source)
+    text = ''
+    base = 0
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        else:
+            text += chunk
+        position = 0
+        length = len(text)
+        while position < length:
+            state = 0
+            last = -1
+            end = position
+            cursor = position
+            while cursor < length:
+                code = ord(text[cursor])
+                if code < 256:
+                    column = latin[code]
+                else:
+                    run = bisect_right(runStarts, code) - 1
+                    column = runs[run][2] if run >= 0 and code <= runs[run][1] else other
+                state = table[state * width + column]
+                if state < 0:
+                    break
+                cursor += 1
+                if accept[state] >= 0:
+                    last = accept[state]
+                    end = cursor
+            if cursor == length and state >= 0 and not final:
+                break
+            if last < 0:
+                message = "Lexical error at offset {}: unexpected {!r}".format(
+                    base + position, text[position])
+                if errors is None:
+                    raise Exception(message)
+                errors.append("Error: " + message)
+                if not recover:
+                    return
+                position += 1
+                continue
+            if not ignored[last]:
+                yield names[last]
+            position = end
+        text = text[position:]
+        base += position
+
+
+# Parses a file, reporting its lexical errors along with the syntax errors.
+# Without recover a lexical error ends the input, so the error the parser
+# then reports at the cut is left out
+def parse_source(filename, trace=None, recover=False):
+    lexical = []
+    accepted, errorList = parse(tokens_of(filename, lexical, recover), trace,
+                                recover=recover)
+    if lexical:
+        accepted = False
+        errorList = lexical + errorList if recover else lexical
+    return accepted, errorList
+
+
+def parse_file(filename, recover=False):
+    accepted, errorList = parse_source(filename, recover=recover)
+    return filename, accepted, errorList
+
 
-def parse(data):
-    stack = []
+# Parses every file in paths, directories are expanded to the files they
+# contain. The parse tables are copied once into shared memory and every
+# worker maps that block instead of holding a copy of its own. Results come
+# back as (filename, accepted, errors) in input order
+def parse_files(paths, workers=None, chunksize=16, recover=False):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(os.path.join(path, name)
+                                    for name in os.listdir(path)
+                                    if os.path.isfile(os.path.join(path, name))))
+        else:
+            filenames.append(path)
+    if workers == 1 or len(filenames) < 2:
+        return [parse_file(filename, recover) for filename in filenames]
+    block = None
+    if share_tables is not None:
+        block = share_tables(parseTables)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared,
+                                 initargs=(block and block.name,)) as pool:
+            return list(pool.map(parse_file, filenames,
+                                 [recover] * len(filenames),
+                                 chunksize=chunksize))
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+
+# Worker initializer: the tables the worker inherited or loaded on import
+# are dropped for a view of the shared block
+def attach_shared(name):
+    global parseTables
+    if name is not None:
+        parseTables = attach_tables(name)
+
+
+# Parse tree kept as parallel arrays in post-order, so a reduce appends one
+# node after its children and no object is created per node. kind holds the
+# production index of an interior node or -1 - column for a leaf, and start
+# the token position of a leaf or the offset of the node's child ids in
+# children. Columns past the terminals stand for the nonterminal that error
+# recovery assumed in place of the input it skipped. The root is the last
+# node appended
+class Tree:
+    def __init__(this):
+        this.kind = array('i')
+        this.start = array('i')
+        this.children = array('i')
+
+    def leaf(this, column, position):
+        this.kind.append(-1 - column)
+        this.start.append(position)
+        return len(this.kind) - 1
+
+    def node(this, production, children):
+        this.kind.append(production)
+        this.start.append(len(this.children))
+        this.children.extend(children)
+        return len(this.kind) - 1
+
+    def root(this):
+        return len(this.kind) - 1 if this.kind else None
+
+    # Terminal name of a leaf or header of an interior node
+    def symbol(this, node):
+        kind = this.kind[node]
+        if kind >= 0:
+            return parseTables.productions[kind][0]
+        column = -1 - kind
+        if column < len(parseTables.terminals):
+            return parseTables.terminals[column]
+        return parseTables.nonTerminals[column - len(parseTables.terminals)]
+
+    def childrenOf(this, node):
+        kind = this.kind[node]
+        if kind < 0:
+            return ()
+        start = this.start[node]
+        return this.children[start:start + parseTables.length[kind]]
+
+    # (node, depth) pairs in pre-order, produced on demand
+    def walk(this, node=None):
+        if node is None:
+            node = this.root()
+            if node is None:
+                return
+        pending = [(node, 0)]
+        while pending:
+            node, depth = pending.pop()
+            yield node, depth
+            children = this.childrenOf(node)
+            for position in range(len(children) - 1, -1, -1):
+                pending.append((children[position], depth + 1))
+
+    # Bottom-up evaluation in arena order, which already has every child
+    # before its parent. visitor(tree, node, values) receives the results
+    # for the node's children; the result for the root is returned
+    def fold(this, visitor):
+        results = []
+        for node in range(len(this.kind)):
+            results.append(visitor(this, node, [results[child] for child
+                                                in this.childrenOf(node)]))
+        return results[-1] if results else None
+
+
+# data is any iterable of tokens, consumed one at a time. The end marker
+# '$' is supplied when the iterable runs out, so it need not be included.
+# trace is None for no report, a callable taking (step, state, lookahead,
+# action), or a path or file object that receives one tab-separated record
+# per step. Render a trace file to PDF with: python report.py trace.txt
+# When a Tree is given it receives the parse tree. With recover the parser
+# resynchronizes after each syntax error, see resume(), and reports every
+# error of the input in one pass
+def parse(data, trace=None, tree=None, recover=False):
+    traceFile = None
+    emit = None
+    if callable(trace):
+        emit = trace
+    elif trace is not None:
+        traceFile = open(trace, 'w') if isinstance(trace, str) else trace
+
+        def emit(step, state, lookahead, action):
+            traceFile.write(f"{step}\t{state}\t{lookahead}\t{action}\n")
+    try:
+        return run(data, emit, tree, recover)
+    finally:
+        if traceFile is not None and isinstance(trace, str):
+            traceFile.close()
+
+
+# Where parsing can go on after a syntax error with the token in column as
+# lookahead. When the grammar has error productions the nearest state on
+# the stack that shifts the error token resumes there, as in yacc. Without
+# them the nearest state with a GOTO on a nonterminal whose FOLLOW holds
+# the token resumes as if that nonterminal had been reduced (panic mode).
+# Either way the token must have an action in the state pushed.
+# Returns (states kept, state pushed, column of the symbol pushed) or None
+def resume(stack, column):
+    tables = parseTables
+    actions = tables.action
+    gotos = tables.goto
+    width = len(tables.terminals)
+    gotoWidth = len(tables.nonTerminals)
+    if column is None:
+        return None
+    errorColumn = tables.terminalIndex.get('error')
+    if errorColumn is not None:
+        for depth in range(len(stack), 0, -1):
+            code = actions[stack[depth - 1] * width + errorColumn]
+            if code > 0 and actions[(code - 1) * width + column]:
+                return depth, code - 1, errorColumn
+        return None
+    for depth in range(len(stack), 0, -1):
+        state = stack[depth - 1]
+        for nonTerminal in range(gotoWidth):
+            target = gotos[state * gotoWidth + nonTerminal]
+            if target >= 0 and column in tables.follow[nonTerminal] and \
+                    actions[target * width + column]:
+                return depth, target, width + nonTerminal
+    return None
+
+
+def run(data, emit, tree=None, recover=False):
+    stack = [0]
     symbols = []
+    nodes = []
     errorList = []
-    dataCopy = data.copy()
-    actionTable = processor.actionTable
-    gotoTable = processor.goToTable
-    grammar = processor.grammar
-    stack.append(next(iter(actionTable)))
-    production_numbers = enumerateGrammar(grammar.productions)
-    going = True
+    tokens = iter(data)
+    tables = parseTables
+    actions = tables.action
+    gotos = tables.goto
+    columns = tables.terminalIndex
+    width = len(tables.terminals)
+    gotoWidth = len(tables.nonTerminals)
     counter = 0
+    firstData = next(tokens, '$')
+    position = 0
+    # Errors are not reported again until three tokens were shifted after a
+    # recovery, and a second error on the token a recovery resumed at
+    # discards it so the parser always moves on
+    quiet = 0
+    resumedAt = -1
 
-    # Create a PDF instance
-    pdf = PDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    # Add a new page
-    pdf.add_page()
-    # Set font and size for the chapter title
-    pdf.set_font("Arial", "B", 16)
-    actionList = []  # Initialize the actionList
-
-    while going:
+    while True:
         counter += 1
         lastStack = stack[-1]
-        firstData = data[0]
-        if actionTable.get(lastStack, {}).get(firstData) == 'acc':
-            going = False
+        column = columns.get(firstData)
+        code = actions[lastStack * width + column] if column is not None else 0
+        if code == tables.ACCEPT:
+            if emit:
+                emit(counter, lastStack, firstData, 'accept')
             break
-        elif actionTable.get(lastStack, {}).get(firstData, '\nerror')[0] == 's':
+        elif code > 0:
             symbols.append(firstData)
-            stack.append(int(actionTable[lastStack][firstData][1:]))
-            data.pop(0)
-            action = 'Shift'
-            actionList.append(action)  # Add the action to actionList
-        elif actionTable.get(lastStack, {}).get(firstData, '\nerror')[0] == 'r':
-            prodNumber = int(actionTable[lastStack][firstData][1:])
-            for production, number in production_numbers.items():
-                if number == prodNumber:
-                    break
-            else:
-                errorList.append("Error: Invalid production number '" + number +
-                                 "'")
+            stack.append(code - 1)
+            if tree is not None:
+                nodes.append(tree.leaf(column, position))
+            if quiet:
+                quiet -= 1
+            if emit:
+                emit(counter, lastStack, firstData, 'shift ' + str(code - 1))
+            firstData = next(tokens, '$')
+            position += 1
+        elif code < 0:
+            prodNumber = -code - 1
+            header, prodList = tables.productions[prodNumber]
+            length = tables.length[prodNumber]
+            if length >= len(stack):
+                errorList.append("Error: Reduction 'r" + str(-code) +
+                                 "' cannot be performed due to insufficient symbols in the stack")
                 break
-            prodList = production.split()
-            if len(prodList) > len(stack):
-                errorList.append(
-                    "Error: Reduction 'r" + prodNumber + "' cannot be performed due to insufficient symbols in the stack")
-                break
-            for _ in range(len(prodList)):
-                stack.pop()
-            header = None
-            for key, value in grammar.productions.items():
-                if production in value:
-                    header = key
-                    break
-            else:
-                errorList.append(
-                    "Error: Production header '" + header + "' not found")
-                break
-            prodList = production.split()
-            symbolList = symbols[:]
-            for i in range(len(symbolList)):
-                if symbolList[i:i + len(prodList)] == prodList:
-                    symbolList[i:i + len(prodList)] = [header]
-            symbols = symbolList
-            try:
-                stack.append(gotoTable[stack[-1]][header])
-            except KeyError:
+            # The symbol stack mirrors the state stack below state 0, so a
+            # reduce only pops the rhs off both
+            if length:
+                del stack[-length:]
+                del symbols[-length:]
+            symbols.append(header)
+            if tree is not None:
+                children = nodes[len(nodes) - length:]
+                del nodes[len(nodes) - length:]
+                nodes.append(tree.node(prodNumber, children))
+            nextState = gotos[stack[-1] * gotoWidth + tables.lhs[prodNumber]]
+            if nextState < 0:
                 errorList.append("Error: Invalid input '(" + str(lastStack) +
                                  "," + firstData + ")' in goto table")
                 break
-            action = f"Reduce using {header} -> {production}"
-            actionList.append(action)  # Add the action to actionList
+            stack.append(nextState)
+            if emit:
+                emit(counter, lastStack, firstData,
+                     f"reduce {header} -> {' '.join(prodList)}")
+        else:
+            if not quiet:
+                errorList.append("Error: Unexpected token '" + firstData +
+                                 "' at position " + str(position) +
+                                 " in state " + str(lastStack))
+                if emit and recover:
+                    emit(counter, lastStack, firstData, errorList[-1])
+            if not recover:
+                break
+            skip = position == resumedAt
+            found = None
+            while True:
+                if skip:
+                    if firstData == '$':
+                        break
+                    firstData = next(tokens, '$')
+                    position += 1
+                found = resume(stack, columns.get(firstData))
+                if found is not None:
+                    break
+                skip = True
+            if found is None:
+                break
+            depth, nextState, symbolColumn = found
+            del stack[depth:]
+            del symbols[depth - 1:]
+            stack.append(nextState)
+            if symbolColumn < width:
+                symbols.append(tables.terminals[symbolColumn])
+            else:
+                symbols.append(tables.nonTerminals[symbolColumn - width])
+            if tree is not None:
+                del nodes[depth - 1:]
+                nodes.append(tree.leaf(symbolColumn, position))
+            quiet = 3
+            resumedAt = position
 
-        # Add the chapter title to the PDF
-        pdf.chapter_title(f"Iteration {counter}")
+    if errorList and emit and not recover:
+        emit(counter, stack[-1], firstData, errorList[0])
+    return not errorList, errorList
 
-        # Add the chapter body to the PDF
-        pdf.chapter_body(counter, stack, symbols,
-                         dataCopy, actionList, errorList)
 
-        # Check if the page break is needed
-        if pdf.y > 180:
-            pdf.add_page()
+# Re-parses a token list after edits. The state stack is saved at token
+# offsets before any action on that token, which depends only on the tokens
+# before it: every interval tokens and at offsets passed to mark(). edit()
+# resumes from the nearest checkpoint at or before the edit and stops early
+# when the stack at an offset past the edit equals the old stack there,
+# since the rest of the parse is then unchanged
+class IncrementalParser:
+    def __init__(this, tokens, interval=256):
+        this.tokens = list(tokens)
+        this.interval = interval
+        this.marks = set()
+        this.checkpoints = {}
+        this.accepted = False
+        this.errors = []
+        this.errorPosition = None
+        this.errorState = None
+        this.advance([0], 0, {}, 0)
 
-    if not errorList:
-        print(f"\nTokens processed")
-        for string in dataCopy:
-            print(f"{string:<6}")
-    else:
-        print(f"\nError processing tokens")
-        for error in errorList:
-            print(error)
+    def mark(this, offset):
+        this.marks.add(offset)
+
+    def result(this):
+        return this.accepted, this.errors
+
+    # Replaces tokens[start:end] with replacement and returns the new result
+    def edit(this, start, end, replacement=()):
+        replacement = list(replacement)
+        delta = len(replacement) - (end - start)
+        this.tokens[start:end] = replacement
+        old = {}
+        kept = {}
+        for offset, stack in this.checkpoints.items():
+            if offset <= start:
+                kept[offset] = stack
+            elif offset >= end:
+                old[offset + delta] = stack
+        this.checkpoints = kept
+        this.marks = {offset if offset <= start else offset + delta
+                      for offset in this.marks if offset <= start or offset >= end}
+        resume = max(kept)
+        previous = (this.accepted, this.errors, this.errorPosition,
+                    this.errorState)
+        converged = this.advance(list(kept[resume]), resume, old,
+                                 start + len(replacement))
+        if converged is not None:
+            this.checkpoints.update((offset, stack) for offset, stack in old.items()
+                                    if offset > converged)
+            this.accepted, this.errors, this.errorPosition, \
+                this.errorState = previous
+            if this.errorPosition is not None and delta:
+                this.fail(this.errorPosition + delta, this.errorState)
+        return this.result()
+
+    def fail(this, position, state):
+        lookahead = this.tokens[position] if position < len(this.tokens) else '$'
+        this.accepted = False
+        this.errors = ["Error: Unexpected token '" + lookahead +
+                       "' at position " + str(position) + " in state " + str(state)]
+        this.errorPosition = position
+        this.errorState = state
+
+    # Parses from stack at position. Returns the offset where the stack met
+    # an old checkpoint at or past boundary, or None after a full parse
+    def advance(this, stack, position, old, boundary):
+        tables = parseTables
+        actions = tables.action
+        gotos = tables.goto
+        columns = tables.terminalIndex
+        width = len(tables.terminals)
+        gotoWidth = len(tables.nonTerminals)
+        tokens = this.tokens
+        count = len(tokens)
+        while True:
+            if position >= boundary and old.get(position) == tuple(stack):
+                return position
+            if position % this.interval == 0 or position in this.marks:
+                this.checkpoints[position] = tuple(stack)
+            lookahead = tokens[position] if position < count else '$'
+            column = columns.get(lookahead)
+            while True:
+                state = stack[-1]
+                code = actions[state * width + column] if column is not None else 0
+                if code == tables.ACCEPT:
+                    this.accepted, this.errors, this.errorPosition = True, [], None
+                    return None
+                if code > 0:
+                    stack.append(code - 1)
+                    position += 1
+                    break
+                if code < 0:
+                    prodNumber = -code - 1
+                    length = tables.length[prodNumber]
+                    if length:
+                        del stack[-length:]
+                    nextState = gotos[stack[-1] * gotoWidth + tables.lhs[prodNumber]]
+                    if nextState >= 0:
+                        stack.append(nextState)
+                        continue
+                this.fail(position, state)
+                return None
+
+
+# Push-driven parse of one token stream, for tokens that arrive over time.
+# feed() runs every action a token allows and returns, close() feeds the
+# end marker. Errors and recovery are the ones of run(), and positions
+# holds the token position of each error. accepted stays None until the
+# stream is accepted or rejected
+class PushParser:
+    def __init__(this, recover=False):
+        this.recover = recover
+        this.stack = [0]
+        this.position = 0
+        this.errors = []
+        this.positions = []
+        this.accepted = None
+        this.quiet = 0
+        this.resumedAt = -1
+        this.skipping = False
+
+    def feed(this, token):
+        if this.accepted is not None:
+            return this.accepted
+        tables = parseTables
+        actions = tables.action
+        gotos = tables.goto
+        width = len(tables.terminals)
+        gotoWidth = len(tables.nonTerminals)
+        stack = this.stack
+        column = tables.terminalIndex.get(token)
+        if this.skipping and not this.resync(token, column):
+            return this.accepted
+        while True:
+            state = stack[-1]
+            code = actions[state * width + column] if column is not None else 0
+            if code == tables.ACCEPT:
+                this.accepted = not this.errors
+                return this.accepted
+            if code > 0:
+                stack.append(code - 1)
+                this.position += 1
+                if this.quiet:
+                    this.quiet -= 1
+                return None
+            if code < 0:
+                prodNumber = -code - 1
+                length = tables.length[prodNumber]
+                if length >= len(stack):
+                    this.error("Error: Reduction 'r" + str(-code) +
+                               "' cannot be performed due to insufficient symbols in the stack")
+                    return this.reject()
+                if length:
+                    del stack[-length:]
+                nextState = gotos[stack[-1] * gotoWidth + tables.lhs[prodNumber]]
+                if nextState < 0:
+                    this.error("Error: Invalid input '(" + str(state) + "," +
+                               token + ")' in goto table")
+                    return this.reject()
+                stack.append(nextState)
+                continue
+            if not this.quiet:
+                this.error("Error: Unexpected token '" + token + "' at position " +
+                           str(this.position) + " in state " + str(state))
+            if not this.recover:
+                return this.reject()
+            if this.position == this.resumedAt or not this.resync(token, column):
+                return this.discard(token)
 
-    # Output the PDF file
-    pdf.output("SLRreport.pdf")
+    def close(this):
+        return this.feed('$')
 
+    def error(this, message):
+        this.errors.append(message)
+        this.positions.append(this.position)
 
-def enumerateGrammar(grammar):
-    production_numbers = {}
-    count = 1
-    for key, values in grammar.items():
-        for value in values:
-            production_numbers[value] = count
-            count += 1
-    return production_numbers
+    def reject(this):
+        this.accepted = False
+        return False
+
+    # Drops the token that could not resume the parse
+    def discard(this, token):
+        if token == '$':
+            return this.reject()
+        this.position += 1
+        this.skipping = True
+        return None
+
+    # Resumes after an error with token as lookahead, as run() does.
+    # Returns False when the token has to be discarded
+    def resync(this, token, column):
+        found = resume(this.stack, column)
+        if found is None:
+            if this.skipping:
+                this.discard(token)
+            return False
+        depth, nextState, symbolColumn = found
+        del this.stack[depth:]
+        this.stack.append(nextState)
+        this.quiet = 3
+        this.resumedAt = this.position
+        this.skipping = False
+        return True
+
+    def result(this):
+        return {'accepted': bool(this.accepted),
+                'errors': [{'position': position, 'message': message}
+                           for position, message in zip(this.positions,
+                                                        this.errors)]}
+
+
+# Parse service. Frames in both directions are a stream id and a length,
+# two big-endian 32-bit integers, followed by that many bytes. A request
+# frame carries whitespace-separated token names, never part of a token,
+# and an empty frame ends its stream. The reply to an ended stream is one
+# frame with the JSON {"accepted": bool, "errors": [{"position", "message"}]}.
+# Any number of streams can be interleaved on one connection, each parsed by
+# its own PushParser as its frames come in, and a stream id can be used
+# again once its reply was sent
+FRAME = struct.Struct('>II')
+MAX_FRAME = 1 << 24
+
+
+async def serve_streams(reader, writer, recover=False):
+    parsers = {}
+    try:
+        while True:
+            try:
+                stream, length = FRAME.unpack(
+                    await reader.readexactly(FRAME.size))
+                if length > MAX_FRAME:
+                    break
+                payload = await reader.readexactly(length)
+            except EOFError:
+                break
+            parser = parsers.get(stream)
+            if parser is None:
+                parser = parsers[stream] = PushParser(recover)
+            if length:
+                for token in payload.decode('utf-8', 'replace').split():
+                    if parser.feed(token) is not None:
+                        break
+                continue
+            del parsers[stream]
+            parser.close()
+            reply = json.dumps(parser.result()).encode()
+            writer.write(FRAME.pack(stream, len(reply)) + reply)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+# Serves frames on stdin and stdout when address is None, on the local TCP
+# port when it is a number and otherwise on a Unix socket at that path.
+# The tables are loaded once, with the module
+async def serve(address=None, recover=False):
+    import asyncio
+    if address is None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await serve_streams(reader, writer, recover)
+        return
+
+    def handle(reader, writer):
+        return serve_streams(reader, writer, recover)
+    if address.isdigit():
+        server = await asyncio.start_server(handle, '127.0.0.1', int(address))
+    else:
+        server = await asyncio.start_unix_server(handle, address)
+    async with server:
+        await server.serve_forever()
 
 
 if __name__ == '__main__':
@@ -169,95 +774,249 @@ if __name__ == '__main__':
 
 
 class Processor:
-    def __init__(this, filename, output=None):
-        try:
-            this.output = output
-            this.errors = False
-            this.stateCount = 0
-            this.result = None
-            this.filename = filename
-            this.file = open(filename, 'r')
-            this.lines = this.file.readlines()
-        except FileNotFoundError:
+    # mode is 'slr' for reductions on FOLLOW sets or 'lalr' for LALR(1)
+    # lookaheads computed on the same LR(0) automaton. With incremental the
+    # state of each build is kept and the next compiler() only recomputes
+    # what the edited rules reach. profiler is an optional profiler.Profiler
+    # that times the stages and the hot Parser functions. With collect the
+    # table conflicts are kept in conflicts instead of raised
+    def __init__(this, filename, output=None, standalone=False, lexer=None,
+                 mode='slr', incremental=False, profiler=None, collect=False):
+        if mode not in ('slr', 'lalr'):
+            raise Exception("Unknown table mode '" + str(mode) + "'")
+        if not os.path.isfile(filename):
             raise Exception('File could not be opened')
+        this.output = output
+        this.mode = mode
+        this.incremental = incremental
+        this.profiler = profiler
+        this.collect = collect
+        this.conflicts = []
+        this.resolved = set()
+        this.reused = {'closures': 0, 'rows': 0}
+        this.standalone = standalone
+        this.lexer = lexer
+        this.scanner = None
+        this.ignored = set()
+        this.errors = False
+        this.stateCount = 0
+        this.result = None
+        this.filename = filename
+        this.spec = None
 
     def compiler(this):
-        this.detect_and_handle_errors()
-        this.process_tokens()
-        this.build_and_transform_grammar()
-
-    def detect_and_handle_errors(this):
-        errors = []
+        with this.stage('detect_and_handle_errors'):
+            this.detect_and_handle_errors()
+        with this.stage('process_tokens'):
+            this.process_tokens()
+        with this.stage('build_and_transform_grammar'):
+            this.grammar = this.build_and_transform_grammar()
+        previous = load_build(this.filename, this.mode) \
+            if this.incremental else None
+        changed = this.changed_headers(previous)
+        passes = ('encode', 'first_sets', 'follow_sets')
+        if this.profiler is not None:
+            this.profiler.instrument(this.grammar, *passes)
+        with this.stage('analyze'):
+            this.grammar.analyze(previous, changed)
+        if this.profiler is not None:
+            # The grammar is pickled into the cache, wrappers and all
+            this.profiler.release(this.grammar, *passes)
+        this.parser = Parser(this.grammar)
+        if this.profiler is not None:
+            this.profiler.instrument(this.parser, 'closure', 'transitions')
+        kept = this.reuse_closures(previous, changed)
+        with this.stage('build_automata'):
+            this.automata = this.build_automata(this.first_set())
+        with this.stage('create_table'):
+            this.actionTable, this.goToTable = this.create_table(
+                this.reusable_rows(previous, kept))
+        if this.incremental:
+            this.save_build()
+        with this.stage('tables'):
+            this.tables = ParseTables(this.grammar.terminals + ['$'],
+                                      list(this.grammar.productions),
+                                      this.parser.productions,
+                                      this.actionTable, this.goToTable,
+                                      this.grammar.follow)
+            if this.lexer:
+                this.scanner = ScanTables(this.lexerSpec.dfa.automaton,
+                                          this.lexerSpec.dfa.names,
+                                          this.ignored)
+        # Tables with unresolved conflicts are kept out of the cache, so
+        # they never reach a parser that loads it
+        if not this.conflicts:
+            with this.stage('save_cache'):
+                this.save_cache()
+        if this.output:
+            with this.stage('generateOutput'):
+                this.generateOutput(this.output, this.standalone)
 
-        def add_error(message):
-            errors.append(message)
+    # Times a compiler() stage when a profiler was given
+    def stage(this, name):
+        if this.profiler is None:
+            return nullcontext()
+        return this.profiler.stage(name)
 
-        def is_valid_comment(line):
-            return line.startswith("/*") and not line.endswith("*/")
+    def save_cache(this):
+        return save_tables(this.filename, this.tables, dict(vars(this.grammar)),
+                           this.scanner, this.lexer, this.mode,
+                           this.automaton_data())
 
-        def is_valid_token(line):
-            return line.startswith("%") and line != '%%'
+    # Restores the grammar and tables of a previous build of the same .yalp
+    # content, returns False when there is nothing to reuse
+    def load_cache(this):
+        cached = load_tables(this.filename, this.lexer, this.mode)
+        if cached is None:
+            return False
+        this.grammar = Grammar()
+        vars(this.grammar).update(cached['grammar'])
+        this.tables = cached['tables']
+        this.scanner = cached['scanner']
+        this.automatonData = cached['automaton']
+        return True
 
-        def is_valid_token_declaration(line):
-            return line.startswith("%token")
+    def save_build(this):
+        return save_build(this.filename, {
+            'productions': this.grammar.productions,
+            'precedence': this.grammar.precedence,
+            'nullable': this.grammar.nullable,
+            'first': this.grammar.first,
+            'follow': this.grammar.follow,
+            'items': this.parser.productions,
+            'kernels': [state.heart for state in this.automata.states],
+            'closures': [state.productions for state in this.automata.states],
+            'action': this.actionTable,
+            'goTo': this.goToTable,
+            'conflicted': sorted({conflict['state']
+                                  for conflict in this.conflicts}),
+            'resolved': sorted(this.resolved),
+            'rulePrecedence': this.grammar.rulePrecedence,
+        }, this.mode)
 
-        def is_valid_ignore(line):
-            return line.startswith("IGNORE")
+    # Headers added, removed or with different productions since the build
+    # in previous, or None when there is no earlier build to compare with
+    def changed_headers(this, previous):
+        if previous is None:
+            return None
+        if previous['precedence'] != this.grammar.precedence:
+            return set(previous['productions']) | set(this.grammar.productions)
+        old = previous['productions']
+        new = this.grammar.productions
+        return {header for header in set(old) | set(new)
+                if old.get(header) != new.get(header)}
 
-        def is_missing_mark(line):
-            return line == '%%'
-        exist = False
-        for i, line in enumerate(this.lines):
-            line = line.strip()
+    # New id of every production of the build in previous, None for the ones
+    # that were removed or that are not unique in either build
+    def moved_productions(this, previous):
+        numbers = {}
+        for number, production in enumerate(this.parser.productions):
+            numbers[production] = None if production in numbers else number
+        seen = set()
+        repeated = set()
+        for production in previous['items']:
+            if production in seen:
+                repeated.add(production)
+            seen.add(production)
+        return [None if production in repeated else numbers.get(production)
+                for production in previous['items']]
 
-            if is_valid_comment(line):
-                add_error("Invalid comment format")
+    # Seeds the parser with the closures of the earlier build that are still
+    # valid: every item still exists and no item has a changed header after
+    # its dot. Returns {new kernel: old state} for those states
+    def reuse_closures(this, previous, changed):
+        if previous is None:
+            return {}
+        items = previous['items']
+        moved = this.moved_productions(previous)
+        kept = {}
+        for state, (heart, closure) in enumerate(zip(previous['kernels'],
+                                                     previous['closures'])):
+            if any(moved[production] is None for production, dot in closure):
+                continue
+            if any(dot < len(items[production][1]) and
+                   items[production][1][dot] in changed
+                   for production, dot in closure):
+                continue
+            heart = frozenset((moved[production], dot)
+                              for production, dot in heart)
+            this.parser.closures[heart] = frozenset(
+                (moved[production], dot) for production, dot in closure)
+            kept[heart] = state
+        this.reused['closures'] = len(kept)
+        return kept
 
-            if line.endswith("*/") and not line.startswith("/*"):
-                add_error("Invalid comment format")
+    # Table rows of the earlier build that can be copied for the states whose
+    # closure was kept, with state and production numbers renumbered. A row
+    # is kept only when FOLLOW did not change for any production it reduces,
+    # so LALR(1) tables, whose lookaheads are global, are always rebuilt
+    def reusable_rows(this, previous, kept):
+        if previous is None or this.mode != 'slr' or \
+                previous['precedence'] != this.grammar.precedence:
+            return {}
+        states = {state.heart: state.state for state in this.automata.states}
+        moved = this.moved_productions(previous)
+        # Productions whose %prec token changed may settle a clash otherwise
+        before = previous['rulePrecedence']
+        after = this.grammar.rulePrecedence
+        reprecedenced = {number for old, number in enumerate(moved)
+                         if number is not None and before[old] != after[number]}
+        renumber = {}
+        for old, heart in enumerate(previous['kernels']):
+            if all(moved[production] is not None for production, dot in heart):
+                renumber[old] = states.get(frozenset(
+                    (moved[production], dot) for production, dot in heart))
+        follow = this.grammar.changedFollow
+        # Rows with a clash, resolved or not, are rebuilt so it is settled
+        # and reported again
+        conflicted = set(previous['conflicted']) | set(previous['resolved'])
+        rows = {}
+        for heart, old in kept.items():
+            new = states.get(heart)
+            if new is None or old in conflicted:
+                continue
+            if any(dot == len(this.parser.productions[production][1]) and
+                   (this.parser.productions[production][0] in follow or
+                    production in reprecedenced)
+                   for production, dot in this.parser.closures[heart]):
+                continue
+            action = {}
+            for terminal, value in previous['action'][old].items():
+                if value[0] == 's':
+                    value = renumber.get(int(value[1:]))
+                    value = None if value is None else 's' + str(value)
+                elif value[0] == 'r':
+                    value = moved[int(value[1:]) - 1]
+                    value = None if value is None else 'r' + str(value + 1)
+                if value is None:
+                    break
+                action[terminal] = value
+            else:
+                goTo = {symbol: renumber.get(target) for symbol,
+                        target in previous['goTo'][old].items()}
+                if None not in goTo.values():
+                    rows[new] = (action, goTo)
+        this.reused['rows'] = len(rows)
+        return rows
 
-            if is_valid_token(line):
-                if exist:
-                    add_error("Invalid token")
-                if is_valid_token_declaration(line):
-                    words = line.split()
-                    if len(words) < 2:
-                        add_error("Unidentified %token")
-                else:
-                    add_error("Invalid 'token' format")
-            if 'token' in line and not line.startswith("%"):
-                add_error("Invalid '%token' format")
-            if is_valid_ignore(line):
-                words = line.split()
-                if len(words) < 2:
-                    add_error("Unidentified 'IGNORE'")
-            if is_missing_mark(line):
-                exist = True
-        if not exist:
-            add_error("Missing '%%' mark")
-        if errors:
-            error_message = "\n".join(set(errors))
-            raise Exception(error_message)
+    # Reads the .yalp in one pass, see yalp.py, and raises every format
+    # problem found at once
+    def detect_and_handle_errors(this):
+        this.spec = YALP(this.filename)
+        if this.spec.errors:
+            raise Exception("\n".join(this.spec.errors))
         return None
 
     def process_tokens(this):
-        tokens = set()
-        ignored_tokens = set()
         all_tokens_present = True
-        with open('Productions/tokens.txt', 'r') as file:
-            file_tokens = {line.strip() for line in file}
-        for line in this.lines:
-            line = line.strip()
-            if line == '%%':
-                break
-            if line.startswith('/*') and line.endswith('*/'):
-                continue
-            if line.startswith('%token'):
-                line_tokens = line.split()[1:]
-                tokens.update(line_tokens)
-            if line.startswith('IGNORE'):
-                ignored_tokens.update(line.split()[1:])
-        tokens = list(tokens - ignored_tokens)
+        if this.lexer:
+            this.lexerSpec = Lexer(this.lexer)
+            file_tokens = set(this.lexerSpec.dfa.names)
+        else:
+            with open('Productions/tokens.txt', 'r') as file:
+                file_tokens = {line.strip() for line in file}
+        this.ignored = set(this.spec.ignored)
+        tokens = this.spec.declared()
         for token in tokens:
             if token not in file_tokens:
                 print(f"{token}: Not detected")
@@ -265,222 +1024,176 @@ class Processor:
         return all_tokens_present, tokens
 
     def build_and_transform_grammar(this):
-        grammar = Grammar()
-        nonTerminals = set()
-        terminals = set()
-        productions_found = False
-        nonterm = None
-        prods = []
-        tempGrammar = None
-        newInitialState = None
-
-        for line in this.lines:
-            line = line.strip()
-            if not productions_found:
-                if line == '%%':
-                    productions_found = True
-                continue
-            if line.endswith(":"):
-                if nonterm is not None:
-                    grammar.productions[nonterm] = prods
-                    nonTerminals.add(nonterm)
-                nonterm = line[:-1].strip()
-                prods = []
-            elif line and not line.startswith('/*') and line != ';':
-                productions = [prod.strip()
-                               for prod in line.split("|") if prod.strip()]
-                prods.extend(productions)
-                for prod in productions:
-                    for symbol in prod.split():
-                        if symbol.islower():
-                            nonTerminals.add(symbol)
-                        elif symbol != ";":
-                            terminals.add(symbol)
-        if nonterm is not None:
-            grammar.productions[nonterm] = prods
-            nonTerminals.add(nonterm)
-        grammar.productions = {nonterm: [prod for prod in prods if prod != ";"]
-                               for nonterm, prods in grammar.productions.items()}
-        grammar.initialState = next(iter(grammar.productions.keys()))
-        grammar.nonTerminals = sorted(nonTerminals)
-        grammar.terminals = sorted(terminals)
-        tempGrammar = copy.deepcopy(grammar)
-        newInitialState = tempGrammar.initialState + "'"
-        if newInitialState in tempGrammar.productions:
-            tempGrammar.productions[newInitialState].insert(
-                0, tempGrammar.initialState)
-            tempGrammar.productions.move_to_end(newInitialState, last=False)
-        else:
-            tempGrammar.productions = OrderedDict(
-                [(newInitialState, [tempGrammar.initialState])] + list(tempGrammar.productions.items()))
-        return tempGrammar
-
-    def format_set(this, set_obj):
-        label = "State {}\n".format_set(set_obj.state)
-        for key, value in set_obj.productions.items():
-            if key in set_obj.heart:
-                label += "*** "
-            production_str = ' | '.join(value)
-            label += "{} -> {}\n".format_set(key, production_str)
-        return label
-
-    def compute_symbols(this, values):
-        symbols = set()
-        for production_set in values.productions.values():
-            for production in production_set:
-                parts = production.split()
-                for part in parts:
-                    if '.' in part:
-                        symbol = part[1:] if part.startswith(
-                            '.') else part.split()[0]
-                        symbols.add(symbol)
-        return list(symbols)
+        if this.spec is None:
+            this.spec = YALP(this.filename)
+        return this.spec.grammar
 
+    def first_set(this):
+        heart = frozenset([(0, 0)])
+        return Set(heart, this.parser.closure(heart))
+
+    # States are looked up by kernel in a hash index, so each kernel is
+    # closed once and every transition costs a single dict probe
     def build_automata(this, firstSet):
         machine = Machine(firstSet.state, [0])
-        unique_hearts = set()
         sets = [firstSet]
-        unique_hearts.add(frozenset(firstSet.heart.items()))
-        for set_obj in sets:
-            symbols = this.compute_symbols(set_obj)
-            for symbol in symbols:
-                newSet = this.irA(set_obj, symbol)
-                newSet_heart = frozenset(newSet.heart.items())
-                if newSet_heart not in unique_hearts:
-                    newSet.state = this.stateCount
-                    this.stateCount += 1
-                    sets.append(newSet)
-                    unique_hearts.add(newSet_heart)
-                    transition = Transition(set_obj, symbol, newSet)
-                    machine.transitions.append(transition)
-                else:
-                    next_state_index = next(i for i, s in enumerate(sets) if frozenset(
-                        s.heart.items()) == newSet_heart)
-                    next_state = sets[next_state_index]
-                    transition = Transition(set_obj, symbol, next_state)
-                    machine.transitions.append(transition)
-        graph = pydot.Dot(graph_type='digraph')
+        index = {firstSet.heart: firstSet}
         for set_obj in sets:
-            label = this.format_set(set_obj)
-            node = pydot.Node(label)
-            graph.add_node(node)
-        for transition in machine.transitions:
-            state = this.format_set(transition.state)
-            next_state = this.format_set(transition.next)
-            edge = pydot.Edge(state, next_state, label=transition.symbol)
-            graph.add_edge(edge)
-        for transition in machine.transitions[::-1]:
-            if transition.state.state == 1:
-                state = this.format_set(transition.state)
-                next_state = 'accept'
-                edge = pydot.Edge(state, next_state, label='$')
-                graph.add_edge(edge)
-                break
-            elif transition.next.state == 1:
-                state = this.format_set(transition.next)
-                next_state = 'accept'
-                edge = pydot.Edge(state, next_state, label='$')
-                graph.add_edge(edge)
-                break
-        graph.write_pdf('LR0.pdf')
+            for symbol, heart in this.parser.transitions(set_obj.productions).items():
+                next_state = index.get(heart)
+                if next_state is None:
+                    next_state = Set(heart, this.parser.closure(heart))
+                    next_state.state = len(sets)
+                    sets.append(next_state)
+                    index[heart] = next_state
+                transition = Transition(set_obj, symbol, next_state)
+                machine.transitions.append(transition)
+        this.stateCount = len(sets)
+        machine.states = sets
         machine.finalState = {'accept'}
         machine.display()
         this.result = machine
         return this.result
 
-    def create_table(this):
-        grammar_productions = this.grammar.productions
-        terminals = this.grammar.terminals
-        nonTerminals = this.grammar.nonTerminals
+    # The LR(0) automaton as plain data, cached with the tables so report.py
+    # can draw it without rebuilding the grammar
+    def automaton_data(this):
+        return {
+            'items': this.parser.productions,
+            'kernels': [state.heart for state in this.automata.states],
+            'states': [state.productions for state in this.automata.states],
+            'transitions': [(transition.state.state, transition.symbol,
+                             transition.next.state)
+                            for transition in this.automata.transitions],
+        }
+
+    # Artifacts are only rendered on request, see report.py for the formats
+    def draw_automata(this, output='LR0.pdf'):
+        from report import write_graph
+        write_graph(this.automaton_data(), output)
+
+    # Production n of the tables is the production with id n - 1, so numbers
+    # are fixed once by the grammar. Reductions come from an index of the
+    # completed items of every state. Conflicts are gathered in
+    # this.conflicts with their state, symbol and items, after precedence
+    # and associativity declarations resolved what they can, as yacc does.
+    # Unless collect is set they are raised together; otherwise the table
+    # keeps the shift, or the reduction by the earlier production. rows
+    # holds finished (action, goTo) rows by state, reused as they are
+    def create_table(this, rows=None):
+        rows = rows or {}
+        terminals = set(this.grammar.terminals)
         follow = this.grammar.follow
+        productions = this.parser.productions
         lr0 = this.automata
-        augmented_header = this.grammar.initialState + "'"
         action = {}
         goTo = {}
-        lr0.getTransitionStates()
+        this.conflicts = []
+        this.resolved = set()
+        adjacency = lr0.getAdjacency()
+        lalr = LALR(this.parser, lr0) if this.mode == 'lalr' else None
+        completed = [[production for production, dot in state.productions
+                      if dot == len(productions[production][1])]
+                     for state in lr0.states]
         for state in lr0.states:
             state_number = state.state
-            if state_number not in action:
-                action[state_number] = {}
-            if state_number not in goTo:
-                goTo[state_number] = {}
-            if state_number == 1:
-                action[state_number]['$'] = 'acc'
-            for transition in lr0.transitions:
-                if transition.state == state:
-                    if transition.symbol == '$':
-                        action[state_number]['$'] = 'acc'
-                    elif transition.symbol in terminals:
-                        action[state_number][transition.symbol] = 's' + \
-                            str(transition.next.state)
-                    elif transition.symbol in nonTerminals:
-                        goTo[state_number][transition.symbol] = transition.next.state
-            for production_key, production_values in state.productions.items():
-                if production_key != augmented_header:
-                    for production in production_values:
-                        if production.endswith('.'):
-                            key = production_key
-                            follow_set = follow[key]
-                            reduced_production = production[:-1]
-                            production_numbers = {}
-                            count = 1
-                            for key, values in grammar_productions.items():
-                                for value in values:
-                                    production_numbers[value] = count
-                                    count += 1
-                            production_number = production_numbers[reduced_production]
-                            for terminal in follow_set:
-                                existing_action = action[state_number].get(
-                                    terminal)
-                                if existing_action is not None:
-                                    if existing_action.startswith('r') and existing_action != 'r' + str(production_number):
-                                        raise Exception(
-                                            "Conflict: Reduce-Shift conflict in state {} and symbol {}".format(state_number, terminal))
-                                    elif existing_action.startswith('s') and existing_action != 's' + str(production_number):
-                                        raise Exception(
-                                            "Conflict: Shift-Reduce conflict in state {} and symbol {}".format(state_number, terminal))
-                                else:
-                                    action[state_number][terminal] = 'r' + \
-                                        str(production_number)
-
+            if state_number in rows:
+                action[state_number], goTo[state_number] = rows[state_number]
+                continue
+            row = action[state_number] = {}
+            goTo[state_number] = {}
+            for transition in adjacency[state_number]:
+                if transition.symbol in terminals:
+                    row[transition.symbol] = 's' + str(transition.next.state)
+                else:
+                    goTo[state_number][transition.symbol] = transition.next.state
+            for production in sorted(completed[state_number]):
+                if production == 0:
+                    this.add_reduce(state, row, '$', production)
+                    continue
+                if lalr is not None:
+                    follow_set = lalr.lookaheads(state_number, production)
+                else:
+                    follow_set = follow[productions[production][0]]
+                for terminal in sorted(follow_set):
+                    this.add_reduce(state, row, terminal, production)
+        if this.conflicts and not this.collect:
+            raise Exception('\n'.join(
+                "Conflict: {} conflict in state {} and symbol {}".format(
+                    conflict['kind'], conflict['state'], conflict['symbol'])
+                for conflict in this.conflicts))
         return action, goTo
 
-    def draw_table(this, output):
-        terminals = this.grammar.terminals.copy()
-        terminals.append('$')
-        nonTerminals = this.grammar.nonTerminals
-        state_width = max(len(str(state))
-                          for state in this.actionTable.keys()) + 2
-        act_width = max(len(term) for term in terminals) + 2
-        goto_width = max(len(nt) for nt in nonTerminals) + 2
-        # Create a new PDF object with landscape orientation
-        pdf = FPDF(orientation='L')
-        # Set up the document
-        pdf.set_title("SLR Table")
-        pdf.set_font("Arial", size=12)
-        # Add a new page
-        pdf.add_page()
-        # Define cell width and height
-        cell_width = 20
-        cell_height = 10
-        # Create and format the table
-        table = [["state", "act"] + terminals + ["", "goto"] + nonTerminals]
-        for state, actions in this.actionTable.items():
-            action_values = [actions.get(term, '') for term in terminals]
-            goto_values = [this.goToTable[state].get(
-                nt, '') for nt in nonTerminals]
-            row = [str(state), ''] + action_values + ['', ''] + goto_values
-            table.append(row)
-        # Add table data to the PDF
-        for row in table:
-            for cell in row:
-                pdf.cell(cell_width, cell_height, str(cell), border=1)
-            pdf.ln(cell_height)
-        # Save the PDF to the output file
-        pdf.output(output)
-
-    def generateOutput(this, output):
+    # Puts the reduction by production, or the accept of the augmented one,
+    # in row for terminal, resolving or recording a clash with what is there
+    def add_reduce(this, state, row, terminal, production):
+        value = 'acc' if production == 0 else 'r' + str(production + 1)
+        existing = row.get(terminal)
+        if existing is None:
+            row[terminal] = value
+            return
+        if existing == value:
+            return
+        this.resolved.add(state.state)
+        items = this.parser.productions
+        if existing[0] == 's':
+            choice = this.precedence_choice(terminal, production)
+            if choice == 'reduce':
+                row[terminal] = value
+            elif choice == 'error':
+                del row[terminal]
+            elif choice is None:
+                shifts = [item for item in sorted(state.productions)
+                          if item[1] < len(items[item[0]][1]) and
+                          items[item[0]][1][item[1]] == terminal]
+                this.add_conflict('Shift-Reduce', state, terminal,
+                                  shifts + [(production, len(items[production][1]))])
+            return
+        other = 0 if existing == 'acc' else int(existing[1:]) - 1
+        this.add_conflict('Reduce-Reduce', state, terminal,
+                          [(number, len(items[number][1]))
+                           for number in sorted((other, production))])
+        if production < other:
+            row[terminal] = value
+
+    def add_conflict(this, kind, state, terminal, items):
+        this.conflicts.append({
+            'kind': kind, 'state': state.state, 'symbol': terminal,
+            'items': [this.parser.format_item(item) for item in items]})
+
+    # How precedence declarations settle a shift of terminal against a
+    # reduction by production: 'shift', 'reduce', 'error' for %nonassoc, or
+    # None when either has no precedence
+    def precedence_choice(this, terminal, production):
+        precedence = this.grammar.precedence
+        token = this.grammar.rulePrecedence[production]
+        if terminal not in precedence or token not in precedence:
+            return None
+        level, associativity = precedence[terminal]
+        rule = precedence[token][0]
+        if rule != level:
+            return 'reduce' if rule > level else 'shift'
+        return {'left': 'reduce', 'right': 'shift'}.get(associativity, 'error')
+
+    def draw_table(this, output='SLRTable.pdf'):
+        from report import write_table
+        write_table(this.tables, output)
+
+    # A standalone parser embeds the tables and does not import processor.py
+    # or any of its dependencies
+    def generateOutput(this, output, standalone=False):
         with open(output, 'w') as file:
-            file.write(HEADER + "\n\n")
-            file.write(PDFCLASS + "\n\n")
+            if standalone:
+                scanner = "\nscanTables = None\n"
+                if this.scanner is not None:
+                    scanner = STANDALONE_SCANNER.format(
+                        lexer=this.lexer, tables=this.scanner.source(),
+                        width=this.scanner.width, other=this.scanner.other)
+                file.write(STANDALONE_HEADER.format(
+                    filename=this.filename, tables=this.tables.source(),
+                    scanner=scanner) + "\n\n")
+            else:
+                file.write(HEADER.format(filename=this.filename,
+                                         lexer=this.lexer,
+                                         mode=this.mode) + "\n\n")
             file.write(BODY)
@@ -0,0 +1,135 @@
+import time
+import tracemalloc
+from functools import wraps
+
+
+# Profiler class
+# Opt-in instrumentation for Processor and generated parsers. Records wall
+# time and call counts by name, and with memory=True the peak memory
+# allocated during each stage, measured with tracemalloc. Stages are timed
+# with the stage() context manager; hot functions are wrapped on a single
+# object by instrument(), so nothing is measured unless a profiler is
+# passed in. callback(name, seconds, peak) is called after every stage.
+#
+#   profiler = Profiler(memory=True)
+#   with profiler:
+#       Processor('YAPar/yap1.yalp', profiler=profiler).compiler()
+#   print(profiler.summary())
+class Profiler:
+    def __init__(this, callback=None, memory=False):
+        this.callback = callback
+        this.memory = memory
+        this.calls = {}
+        this.seconds = {}
+        this.peaks = {}
+        this.order = []
+        this.tracing = False
+
+    def __enter__(this):
+        if this.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            this.tracing = True
+        return this
+
+    def __exit__(this, *exception):
+        if this.tracing:
+            tracemalloc.stop()
+            this.tracing = False
+        return False
+
+    def record(this, name, seconds, calls=1):
+        if name not in this.calls:
+            this.order.append(name)
+            this.calls[name] = 0
+            this.seconds[name] = 0.0
+        this.calls[name] += calls
+        this.seconds[name] += seconds
+
+    def stage(this, name):
+        return Stage(this, name)
+
+    # Replaces each named method of target, on that object only, with a
+    # wrapper that counts and times its calls
+    def instrument(this, target, *names):
+        for name in names:
+            method = getattr(target, name)
+
+            def wrapper(*arguments, method=method, name=name, **keywords):
+                start = time.perf_counter()
+                try:
+                    return method(*arguments, **keywords)
+                finally:
+                    this.record(name, time.perf_counter() - start)
+            setattr(target, name, wraps(method)(wrapper))
+        return target
+
+    # Removes the wrappers instrument() put on target
+    def release(this, target, *names):
+        for name in names:
+            if name in vars(target):
+                delattr(target, name)
+        return target
+
+    # A trace callable for the generated parse(): the time between two
+    # steps is charged to the later one, by kind (shift, reduce, accept or
+    # error), as 'parse.shift' and so on
+    def trace(this):
+        last = [time.perf_counter()]
+
+        def emit(step, state, lookahead, action):
+            now = time.perf_counter()
+            kind = action.split(' ', 1)[0]
+            if kind not in ('shift', 'reduce', 'accept'):
+                kind = 'error'
+            this.record('parse.' + kind, now - last[0])
+            last[0] = now
+        return emit
+
+    def report(this):
+        return [{'name': name, 'calls': this.calls[name],
+                 'seconds': this.seconds[name], 'peak': this.peaks.get(name)}
+                for name in this.order]
+
+    def summary(this):
+        rows = [('name', 'calls', 'seconds', 'per call', 'peak KiB')]
+        for entry in sorted(this.report(), key=lambda entry: -entry['seconds']):
+            calls = entry['calls']
+            rows.append((entry['name'], str(calls), f"{entry['seconds']:.6f}",
+                         f"{entry['seconds'] / calls:.2e}" if calls else '-',
+                         '-' if entry['peak'] is None
+                         else f"{entry['peak'] / 1024:.1f}"))
+        widths = [max(len(row[column]) for row in rows)
+                  for column in range(len(rows[0]))]
+        return '\n'.join('  '.join(value.ljust(width) if column == 0
+                                   else value.rjust(width)
+                                   for column, (value, width)
+                                   in enumerate(zip(row, widths)))
+                         for row in rows)
+
+
+# Stage class
+# Context manager returned by Profiler.stage()
+class Stage:
+    def __init__(this, profiler, name):
+        this.profiler = profiler
+        this.name = name
+
+    def __enter__(this):
+        if this.profiler.memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            this.base = tracemalloc.get_traced_memory()[0]
+        this.start = time.perf_counter()
+        return this
+
+    def __exit__(this, *exception):
+        seconds = time.perf_counter() - this.start
+        profiler = this.profiler
+        profiler.record(this.name, seconds)
+        peak = None
+        if profiler.memory and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - this.base)
+            profiler.peaks[this.name] = max(peak,
+                                            profiler.peaks.get(this.name, 0))
+        if profiler.callback is not None:
+            profiler.callback(this.name, seconds, peak)
+        return False
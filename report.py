@@ -0,0 +1,198 @@
+import sys
+from fpdf import FPDF
+from tables import load_tables
+
+
+# PDF class
+# Renders the per-step trace written by the generated parse(), one chapter
+# per step, after parsing has finished
+class PDF(FPDF):
+    def header(this):
+        this.set_font("Arial", "B", 12)
+        this.cell(0, 10, "SLR Parser Report", ln=True)
+
+    def footer(this):
+        this.set_y(-15)
+        this.set_font("Arial", "I", 8)
+        this.cell(0, 10, f"Page {this.page_no()}", 0, 0, "C")
+
+    def chapter_title(this, title):
+        this.set_font("Arial", "B", 12)
+        this.ln(10)
+        this.cell(0, 10, title, ln=True)
+
+    def chapter_body(this, state, lookahead, action):
+        this.set_font("Arial", "", 12)
+        this.cell(0, 10, f"State: {state}", ln=True)
+        this.cell(0, 10, f"Lookahead: {lookahead}", ln=True)
+        this.cell(0, 10, f"Action: {action}", ln=True)
+
+
+def read_trace(filename):
+    with open(filename, 'r') as file:
+        for line in file:
+            step, state, lookahead, action = line.rstrip('\n').split('\t', 3)
+            yield int(step), int(state), lookahead, action
+
+
+def render_trace(filename, output='SLRreport.pdf'):
+    pdf = PDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    for step, state, lookahead, action in read_trace(filename):
+        pdf.chapter_title(f"Iteration {step}")
+        pdf.chapter_body(state, lookahead, action)
+    pdf.output(output)
+
+
+# Label of every state: its items, kernel items marked with ***
+def state_labels(automaton):
+    labels = []
+    items = automaton['items']
+    for state, (heart, closure) in enumerate(zip(automaton['kernels'],
+                                                 automaton['states'])):
+        lines = ["State {}".format(state)]
+        for production, dot in sorted(closure):
+            header, body = items[production]
+            lines.append(('*** ' if (production, dot) in heart else '') +
+                         header + ' -> ' +
+                         ' '.join(body[:dot] + ('.',) + body[dot:]))
+        labels.append(lines)
+    return labels
+
+
+# The state that holds the completed augmented production
+def accepting_state(automaton):
+    augmented = (0, len(automaton['items'][0][1])) if automaton['items'] else None
+    for state, heart in enumerate(automaton['kernels']):
+        if augmented in heart:
+            return state
+    return None
+
+
+def automaton_dot(automaton):
+    def quote(text):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    lines = ['digraph LR0 {', '    node [shape=box];']
+    for state, label in enumerate(state_labels(automaton)):
+        lines.append('    {} [label={}];'.format(
+            state, quote('\n'.join(label) + '\n').replace('\n', '\\l')))
+    for state, symbol, target in automaton['transitions']:
+        lines.append('    {} -> {} [label={}];'.format(state, target,
+                                                      quote(symbol)))
+    accept = accepting_state(automaton)
+    if accept is not None:
+        lines.append('    accept [shape=doublecircle];')
+        lines.append('    {} -> accept [label="$"];'.format(accept))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def automaton_text(automaton):
+    moves = {}
+    for state, symbol, target in automaton['transitions']:
+        moves.setdefault(state, []).append((symbol, target))
+    accept = accepting_state(automaton)
+    blocks = []
+    for state, label in enumerate(state_labels(automaton)):
+        lines = label[:1] + ['    ' + line for line in label[1:]]
+        lines.extend('    {} => {}'.format(symbol, target)
+                     for symbol, target in moves.get(state, ()))
+        if state == accept:
+            lines.append('    $ => accept')
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks) + '\n'
+
+
+# Rows of the ACTION and GOTO tables as strings, header row first
+def table_rows(tables):
+    rows = [['state'] + tables.terminals + tables.nonTerminals]
+    for state in range(tables.stateCount):
+        row = [str(state)]
+        base = state * len(tables.terminals)
+        row.extend(tables.decode(tables.action[base + column])
+                   for column in range(len(tables.terminals)))
+        base = state * len(tables.nonTerminals)
+        row.extend('' if tables.goto[base + column] < 0
+                   else str(tables.goto[base + column])
+                   for column in range(len(tables.nonTerminals)))
+        rows.append(row)
+    return rows
+
+
+def table_text(tables):
+    rows = table_rows(tables)
+    widths = [max(len(row[column]) for row in rows)
+              for column in range(len(rows[0]))]
+    return '\n'.join(' | '.join(value.ljust(width)
+                                for value, width in zip(row, widths)).rstrip()
+                     for row in rows) + '\n'
+
+
+# The automaton as DOT source, a PDF laid out by Graphviz (through pydot,
+# which is only needed for this format) or plain text, by extension
+def write_graph(automaton, output='LR0.pdf'):
+    if output.endswith('.dot'):
+        with open(output, 'w') as file:
+            file.write(automaton_dot(automaton))
+    elif output.endswith('.pdf'):
+        import pydot
+        pydot.graph_from_dot_data(automaton_dot(automaton))[0].write_pdf(output)
+    else:
+        with open(output, 'w') as file:
+            file.write(automaton_text(automaton))
+
+
+# The tables as a landscape PDF grid or aligned text, by extension
+def write_table(tables, output='SLRTable.pdf'):
+    if not output.endswith('.pdf'):
+        with open(output, 'w') as file:
+            file.write(table_text(tables))
+        return
+    pdf = FPDF(orientation='L')
+    pdf.set_title("SLR Table")
+    pdf.set_font("Arial", size=12)
+    pdf.add_page()
+    for row in table_rows(tables):
+        for cell in row:
+            pdf.cell(20, 10, cell, border=1)
+        pdf.ln(10)
+    pdf.output(output)
+
+
+# Cached tables and automaton of a grammar, compiling it only when the cache
+# is missing or stale
+def load_artifacts(filename, lexer=None, mode='slr'):
+    cached = load_tables(filename, lexer, mode)
+    if cached is None or cached.get('automaton') is None:
+        from processor import Processor
+        processor = Processor(filename, lexer=lexer, mode=mode)
+        processor.compiler()
+        return processor.tables, processor.automaton_data()
+    return cached['tables'], cached['automaton']
+
+
+USAGE = """Usage:
+    python report.py trace.txt [SLRreport.pdf]
+    python report.py graph grammar.yalp [LR0.pdf|.dot|.txt] [slr|lalr] [lexer.yal]
+    python report.py table grammar.yalp [SLRTable.pdf|.txt] [slr|lalr] [lexer.yal]"""
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(USAGE)
+        sys.exit(1)
+    if sys.argv[1] in ('graph', 'table'):
+        if len(sys.argv) < 3:
+            print(USAGE)
+            sys.exit(1)
+        command, filename = sys.argv[1:3]
+        mode = sys.argv[4] if len(sys.argv) > 4 else 'slr'
+        lexer = sys.argv[5] if len(sys.argv) > 5 else None
+        tables, automaton = load_artifacts(filename, lexer, mode)
+        if command == 'graph':
+            write_graph(automaton, *sys.argv[3:4])
+        else:
+            write_table(tables, *sys.argv[3:4])
+    else:
+        render_trace(*sys.argv[1:3])
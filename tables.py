@@ -0,0 +1,362 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+# Bump whenever the table layout or the construction changes, so caches
+# written by an older generator are rebuilt
+VERSION = '8'
+CACHE_DIR = '__yaparcache__'
+
+
+# ParseTables class
+# Dense ACTION/GOTO tables stored row-major in flat integer arrays. Terminals
+# and nonterminals are mapped to column indexes and every ACTION cell is a
+# signed int:
+#   0      error
+#   s + 1  shift to state s
+#   -n     reduce by production number n (1-based, as in 'rn')
+#   -1     accept, the reduction of the augmented production
+# GOTO cells hold the next state or -1. Each production keeps its lhs id and
+# rhs length so a reduce is one pop of n states and one GOTO lookup. follow
+# holds, per nonterminal, the terminal columns of its FOLLOW set, which the
+# parser uses as synchronizing tokens when it recovers from an error.
+class ParseTables:
+    ERROR = 0
+    ACCEPT = -1
+
+    def __init__(this, terminals, nonTerminals, productions, action, goTo,
+                 follow=None):
+        this.terminals = list(terminals)
+        this.nonTerminals = list(nonTerminals)
+        this.terminalIndex = {terminal: column for column,
+                              terminal in enumerate(this.terminals)}
+        this.nonTerminalIndex = {nonTerminal: column for column,
+                                 nonTerminal in enumerate(this.nonTerminals)}
+        this.productions = [(header, tuple(body))
+                            for header, body in productions]
+        this.lhs = array('i', [this.nonTerminalIndex[header]
+                               for header, body in this.productions])
+        this.length = array('i', [len(body)
+                                  for header, body in this.productions])
+        this.stateCount = len(action)
+        this.action = array('i', [0]) * (this.stateCount * len(this.terminals))
+        this.goto = array('i', [-1]) * \
+            (this.stateCount * len(this.nonTerminals))
+        for state, row in action.items():
+            base = state * len(this.terminals)
+            for terminal, value in row.items():
+                this.action[base + this.terminalIndex[terminal]] = \
+                    this.encode(value)
+        for state, row in goTo.items():
+            base = state * len(this.nonTerminals)
+            for nonTerminal, value in row.items():
+                this.goto[base + this.nonTerminalIndex[nonTerminal]] = value
+        follow = follow or {}
+        this.follow = tuple(frozenset(this.terminalIndex[terminal]
+                                      for terminal in follow.get(nonTerminal, ())
+                                      if terminal in this.terminalIndex)
+                            for nonTerminal in this.nonTerminals)
+
+    def encode(this, value):
+        if value == 'acc':
+            return this.ACCEPT
+        if value[0] == 's':
+            return int(value[1:]) + 1
+        return -int(value[1:])
+
+    def decode(this, code):
+        if code == this.ACCEPT:
+            return 'acc'
+        if code > 0:
+            return 's' + str(code - 1)
+        if code < 0:
+            return 'r' + str(-code)
+        return ''
+
+    def getAction(this, state, terminal):
+        column = this.terminalIndex.get(terminal)
+        if column is None:
+            return this.ERROR
+        return this.action[state * len(this.terminals) + column]
+
+    def getGoto(this, state, nonTerminal):
+        return this.goto[state * len(this.nonTerminals) +
+                         this.nonTerminalIndex[nonTerminal]]
+
+    # Python source that rebuilds these tables as literal tuples, used by
+    # standalone generated parsers that must not import this module
+    def source(this):
+        def rows(values, width):
+            if not width:
+                return '()'
+            lines = [repr(tuple(values[start:start + width]))[1:-1].rstrip(',') + ','
+                     for start in range(0, len(values), width)]
+            return '(\n    ' + '\n    '.join(lines) + '\n)'
+        return '\n'.join([
+            'TERMINALS = ' + repr(tuple(this.terminals)),
+            'NONTERMINALS = ' + repr(tuple(this.nonTerminals)),
+            'PRODUCTIONS = (\n' + ''.join('    ' + repr(production) + ',\n'
+                                           for production in this.productions) + ')',
+            'LHS = ' + repr(tuple(this.lhs)),
+            'LENGTH = ' + repr(tuple(this.length)),
+            'ACTION = ' + rows(this.action, len(this.terminals)),
+            'GOTO = ' + rows(this.goto, len(this.nonTerminals)),
+            'FOLLOW = ' + repr(tuple(tuple(sorted(row))
+                                     for row in this.follow)),
+        ]) + '\n'
+
+    # NumPy views over the same buffers, shaped (states, columns). The parse
+    # loop indexes the array.array objects directly since scalar indexing is
+    # cheaper there than on NumPy arrays. NumPy is imported here so loading
+    # the tables never pays for it
+    def asNumpy(this):
+        try:
+            import numpy
+        except ImportError:
+            raise Exception('NumPy is not available')
+        action = numpy.frombuffer(this.action, dtype=numpy.intc).reshape(
+            this.stateCount, len(this.terminals))
+        goto = numpy.frombuffer(this.goto, dtype=numpy.intc).reshape(
+            this.stateCount, len(this.nonTerminals))
+        return action, goto
+
+
+# ScanTables class
+# The minimized lexer automaton in the same flat layout: transitions over
+# character classes, the rule accepted by each state, a 256-entry class
+# array for Latin-1 and sorted (start, end, class) runs above it. ignored
+# flags the rules whose tokens the scanner drops
+class ScanTables:
+    def __init__(this, automaton, names, ignore=()):
+        this.table = array('i', automaton.table)
+        this.accept = array('i', automaton.accept)
+        this.width = automaton.width
+        this.other = automaton.other
+        this.latin = array('i', automaton.latin)
+        this.runStarts = tuple(automaton.runStarts)
+        this.runs = tuple(tuple(run) for run in automaton.runs)
+        this.names = tuple(names)
+        this.ignored = tuple(name in ignore for name in this.names)
+
+    def source(this):
+        return '\n'.join([
+            'SCAN_TABLE = ' + repr(tuple(this.table)),
+            'SCAN_ACCEPT = ' + repr(tuple(this.accept)),
+            'SCAN_LATIN = ' + repr(tuple(this.latin)),
+            'SCAN_RUNS = ' + repr(this.runs),
+            'SCAN_NAMES = ' + repr(this.names),
+            'SCAN_IGNORED = ' + repr(this.ignored),
+        ]) + '\n'
+
+
+# Binary export of ParseTables for sharing one copy between processes. The
+# layout is a fixed header, the int32 arrays ACTION, GOTO, LHS, LENGTH, the
+# FOLLOW columns as offsets and values, and a UTF-8 JSON trailer with the
+# symbol names and productions. Integers are native, and the header keeps
+# a marker of 1 so a file written on another byte order is refused
+TABLE_MAGIC = b'YAPT'
+TABLE_HEADER = struct.Struct('=4s8s6i')
+
+
+def table_layout(states, terminals, nonTerminals, productions, follow):
+    sizes = [states * terminals, states * nonTerminals, productions,
+             productions, nonTerminals + 1, follow]
+    offsets = []
+    offset = TABLE_HEADER.size
+    for size in sizes:
+        offsets.append((offset, size))
+        offset += size * array('i').itemsize
+    return offsets, offset
+
+
+def export_tables(tables):
+    follow = array('i', [0])
+    columns = array('i')
+    for row in tables.follow:
+        columns.extend(sorted(row))
+        follow.append(len(columns))
+    meta = json.dumps({'terminals': tables.terminals,
+                       'nonTerminals': tables.nonTerminals,
+                       'productions': tables.productions}).encode()
+    header = TABLE_HEADER.pack(TABLE_MAGIC, VERSION.encode(), 1,
+                               tables.stateCount, len(tables.terminals),
+                               len(tables.nonTerminals),
+                               len(tables.productions), len(meta))
+    parts = [header, array('i', tables.action), array('i', tables.goto),
+             array('i', tables.lhs), array('i', tables.length), follow,
+             columns]
+    return b''.join(bytes(part) for part in parts) + meta
+
+
+# Writes the export of tables to path, to be opened with map_tables()
+def write_tables(tables, path):
+    temp = path + '.' + str(os.getpid())
+    with open(temp, 'wb') as file:
+        file.write(export_tables(tables))
+    os.replace(temp, path)
+    return path
+
+
+def map_tables(path):
+    with open(path, 'rb') as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedTables(mapping, mapping)
+
+
+# Copies the export of tables into a new shared memory block. The caller
+# owns the block: it closes and unlinks it once no process needs it.
+# Workers open it by name with attach_tables()
+def share_tables(tables, name=None):
+    data = export_tables(tables)
+    block = shared_memory.SharedMemory(name, create=True, size=len(data))
+    block.buf[:len(data)] = data
+    return block
+
+
+def attach_tables(name):
+    try:
+        block = shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name)
+    return MappedTables(block.buf, block)
+
+
+# MappedTables class
+# Read-only ParseTables over an export held in shared memory or a mapped
+# file. action, goto, lhs and length are memoryviews cast to int straight
+# over the buffer and follow holds slices of it, so nothing the size of the
+# tables is copied; only the names and productions are decoded. close()
+# releases the views and the mapping
+class MappedTables:
+    ERROR = 0
+    ACCEPT = -1
+
+    def __init__(this, buffer, source):
+        this.source = source
+        view = memoryview(buffer).toreadonly()
+        magic, version, order, states, terminals, nonTerminals, \
+            productions, metaLength = TABLE_HEADER.unpack_from(view)
+        if magic != TABLE_MAGIC or order != 1:
+            raise Exception('Not a parse table export')
+        if version.rstrip(b'\0').decode() != VERSION:
+            raise Exception('Parse table export of another version')
+        offsets, end = table_layout(states, terminals, nonTerminals,
+                                    productions, 0)
+        followCount, = struct.unpack_from(
+            '=i', view, offsets[4][0] + nonTerminals * array('i').itemsize)
+        offsets, end = table_layout(states, terminals, nonTerminals,
+                                    productions, followCount)
+        this.views = [view[offset:offset + size * array('i').itemsize].cast('i')
+                      for offset, size in offsets]
+        this.views.append(view)
+        this.action, this.goto, this.lhs, this.length, follow, columns = \
+            this.views[:6]
+        meta = json.loads(bytes(view[end:end + metaLength]).decode())
+        this.stateCount = states
+        this.terminals = meta['terminals']
+        this.nonTerminals = meta['nonTerminals']
+        this.productions = [(header, tuple(body))
+                            for header, body in meta['productions']]
+        this.terminalIndex = {terminal: column for column,
+                              terminal in enumerate(this.terminals)}
+        this.nonTerminalIndex = {nonTerminal: column for column,
+                                 nonTerminal in enumerate(this.nonTerminals)}
+        this.follow = tuple(columns[follow[row]:follow[row + 1]]
+                            for row in range(nonTerminals))
+
+    decode = ParseTables.decode
+    getAction = ParseTables.getAction
+    getGoto = ParseTables.getGoto
+
+    def close(this):
+        this.follow = ()
+        for view in reversed(this.views):
+            view.release()
+        this.views = []
+        this.source.close()
+
+    def __enter__(this):
+        return this
+
+    def __exit__(this, *exception):
+        this.close()
+        return False
+
+
+# Cache files live next to the .yalp and are named after a hash of its
+# content, the content of the .yal lexer built with it, if any, the table
+# mode and the generator version
+def cache_key(filename, lexer=None, mode='slr'):
+    digest = hashlib.sha256((VERSION + mode).encode())
+    for name in (filename, lexer):
+        if name is not None:
+            with open(name, 'rb') as file:
+                digest.update(file.read())
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def cache_path(filename, lexer=None, mode='slr'):
+    return os.path.join(os.path.dirname(filename), CACHE_DIR,
+                        cache_key(filename, lexer, mode) + '.pickle')
+
+
+def save_tables(filename, tables, grammar, scanner=None, lexer=None,
+                mode='slr', automaton=None):
+    path = cache_path(filename, lexer, mode)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + '.' + str(os.getpid())
+    with open(temp, 'wb') as file:
+        pickle.dump({'version': VERSION, 'grammar': grammar, 'tables': tables,
+                     'scanner': scanner, 'automaton': automaton}, file,
+                    pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+    return path
+
+
+# Returns the cached {'grammar', 'tables', 'scanner', 'automaton'} for
+# filename, or None when the .yalp or .yal changed, the generator version
+# differs or there is no cache yet
+def load_tables(filename, lexer=None, mode='slr'):
+    try:
+        with open(cache_path(filename, lexer, mode), 'rb') as file:
+            cached = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if cached.get('version') != VERSION:
+        return None
+    return cached
+
+
+# Build state of the last compilation of a .yalp, kept under a name that
+# does not depend on its content so an edited grammar finds it again
+def build_path(filename, mode='slr'):
+    return os.path.join(os.path.dirname(filename), CACHE_DIR,
+                        os.path.basename(filename) + '.' + mode + '.build')
+
+
+def save_build(filename, state, mode='slr'):
+    path = build_path(filename, mode)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + '.' + str(os.getpid())
+    with open(temp, 'wb') as file:
+        pickle.dump(dict(state, version=VERSION), file,
+                    pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+    return path
+
+
+def load_build(filename, mode='slr'):
+    try:
+        with open(build_path(filename, mode), 'rb') as file:
+            state = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if state.get('version') != VERSION:
+        return None
+    return state
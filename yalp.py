@@ -0,0 +1,152 @@
+import sys
+from machine import Grammar, EPSILON, ERROR_TOKEN, PREC
+
+ASSOCIATIVITY = {'%left': 'left', '%right': 'right', '%nonassoc': 'nonassoc'}
+
+
+# YALP class
+# Reads a .yalp specification line by line in a single pass: the checks of
+# the format, the %token, IGNORE and %left/%right/%nonassoc declarations
+# before the '%%' mark and the productions after it. Precedence lines
+# declare their tokens too, each line binding tighter than the ones above
+# it, and a production may end in '%prec TOKEN' to take that token's
+# precedence. Problems are collected with their line numbers
+# in errors instead of stopping at the first one. The grammar is built
+# augmented, with a fresh start header in front, and its symbol names are
+# interned so equal names share one string
+class YALP:
+    def __init__(this, filename):
+        this.filename = filename
+        this.errors = []
+        this.tokens = []
+        this.ignored = set()
+        this.precedence = {}
+        this.levels = 0
+        this.productions = {}
+        this.used = {}
+        this.nonTerminals = set()
+        this.terminals = set()
+        this.initialState = None
+        this.marked = False
+        header = None
+        try:
+            with open(filename, 'r') as file:
+                for number, line in enumerate(file, 1):
+                    line = line.strip()
+                    if line:
+                        header = this.read_line(number, line, header)
+        except FileNotFoundError:
+            raise Exception('File could not be opened')
+        if not this.marked:
+            this.errors.append("Missing '%%' mark")
+        this.classify()
+        this.grammar = this.build_grammar()
+
+    def error(this, number, message):
+        this.errors.append("Line {}: {}".format(number, message))
+
+    # Checks one stripped, non-empty line and adds what it declares. header
+    # is the nonterminal whose productions are being read, and the one after
+    # this line is returned
+    def read_line(this, number, line, header):
+        comment = line.startswith('/*')
+        closed = line.endswith('*/')
+        if comment and not closed:
+            this.error(number, "Invalid comment format")
+        if closed and not comment:
+            this.error(number, "Invalid comment format")
+        if line[0] == '%' and line != '%%':
+            if this.marked:
+                this.error(number, "Invalid token")
+            directive = line.split()[0]
+            if directive == '%token' or directive in ASSOCIATIVITY:
+                if len(line.split()) < 2:
+                    this.error(number, "Unidentified " + directive)
+            else:
+                this.error(number, "Invalid 'token' format")
+        elif 'token' in line:
+            this.error(number, "Invalid '%token' format")
+        if line.startswith('IGNORE') and len(line.split()) < 2:
+            this.error(number, "Unidentified 'IGNORE'")
+        if not this.marked:
+            if line == '%%':
+                this.marked = True
+            elif comment and closed:
+                pass
+            elif line.startswith('%token'):
+                this.tokens.extend(sys.intern(token)
+                                   for token in line.split()[1:])
+            elif line.startswith('IGNORE'):
+                this.ignored.update(line.split()[1:])
+            elif line.split()[0] in ASSOCIATIVITY:
+                words = line.split()
+                this.levels += 1
+                for token in words[1:]:
+                    token = sys.intern(token)
+                    this.tokens.append(token)
+                    this.precedence[token] = (this.levels,
+                                              ASSOCIATIVITY[words[0]])
+            return header
+        if line == '%%':
+            this.error(number, "Duplicate '%%' mark")
+            return header
+        if line.endswith(':'):
+            header = sys.intern(line[:-1].strip())
+            if this.initialState is None:
+                this.initialState = header
+            # A header that appears again starts over, as in earlier versions
+            this.productions[header] = []
+            return header
+        if comment or line == ';':
+            return header
+        if header is None:
+            this.error(number, "Production outside of a rule: " + line)
+            return header
+        for production in line.split('|'):
+            production = production.strip()
+            if not production or production == ';':
+                continue
+            this.productions[header].append(production)
+            symbols = production.split()
+            if PREC in symbols:
+                position = symbols.index(PREC)
+                if position + 2 != len(symbols):
+                    this.error(number, "Invalid '%prec' format")
+                del symbols[position:]
+            for symbol in symbols:
+                if symbol != ';' and symbol not in EPSILON:
+                    this.used.setdefault(sys.intern(symbol), number)
+        return header
+
+    # A symbol is a nonterminal when it has a rule and a terminal otherwise,
+    # as Grammar.encode() numbers them. A lowercase symbol without a rule is
+    # taken for an undefined nonterminal, except the error token
+    def classify(this):
+        this.nonTerminals = set(this.productions)
+        this.terminals = set(this.used) - this.nonTerminals
+        for symbol, number in this.used.items():
+            if symbol in this.terminals and symbol.islower() and \
+                    symbol != ERROR_TOKEN:
+                this.error(number, "Undefined nonterminal '" + symbol + "'")
+
+    # Tokens that are declared and not IGNOREd
+    def declared(this):
+        return [token for token in dict.fromkeys(this.tokens)
+                if token not in this.ignored]
+
+    # Grammar with the augmented production S' -> S first. The new header
+    # gets as many quotes as it takes not to clash with a rule of the file
+    def build_grammar(this):
+        grammar = Grammar()
+        if this.initialState is None:
+            return grammar
+        augmented = this.initialState + "'"
+        while augmented in this.productions:
+            augmented += "'"
+        grammar.productions = {sys.intern(augmented): [this.initialState]}
+        grammar.productions.update(this.productions)
+        grammar.initialState = this.initialState
+        grammar.precedence = this.precedence
+        grammar.nonTerminals = sorted(this.nonTerminals)
+        grammar.terminals = sorted(this.terminals)
+        return grammar